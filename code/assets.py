@@ -0,0 +1,196 @@
+import pygame
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from os import cpu_count, walk
+from settings import *
+from atlas import atlas_index
+
+
+def decode_image(path):
+    """
+    Legge e decodifica un'immagine in pixel RGBA grezzi.
+
+    Non tocca il display, quindi può girare su un thread di lavoro.
+
+    Returns:
+        Tupla (bytes RGBA, (larghezza, altezza))
+    """
+    surface = pygame.image.load(path)
+    return pygame.image.tobytes(surface, 'RGBA'), surface.get_size()
+
+
+def decode_images(paths, workers=ASSET_LOAD_WORKERS, progress=None):
+    """
+    Decodifica molte immagini su un pool di thread (al massimo uno per core).
+
+    Args:
+        paths: Percorsi delle immagini
+        workers: Thread che decodificano i file
+        progress: Funzione progress(decodificate, totale), chiamata sul thread chiamante
+
+    Yields:
+        (path, Surface RGBA non convertita), nell'ordine in cui finiscono
+    """
+    paths = list(paths)
+    total = len(paths)
+    if progress is not None:
+        progress(0, total)
+
+    workers = min(workers, cpu_count() or 1)
+    if workers <= 1:
+        # Con un solo core i thread non servono
+        for loaded, path in enumerate(paths, 1):
+            pixels, size = decode_image(path)
+            yield path, pygame.image.frombuffer(pixels, size, 'RGBA')
+            if progress is not None:
+                progress(loaded, total)
+    elif paths:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='asset_decode') as executor:
+            futures = {executor.submit(decode_image, path): path for path in paths}
+            for loaded, future in enumerate(as_completed(futures), 1):
+                pixels, size = future.result()
+                yield futures[future], pygame.image.frombuffer(pixels, size, 'RGBA')
+                if progress is not None:
+                    progress(loaded, total)
+
+
+class AssetManager:
+    """
+    Cache condivisa per immagini, cartelle di immagini e font.
+
+    Ogni file viene caricato una volta sola e riusato da Player, NPC,
+    Tile e dialogue box. Se max_images è impostato, le immagini usate
+    meno di recente vengono scartate (LRU): le cartelle tengono solo i
+    percorsi, quindi un'immagine scartata viene ricaricata dal file alla
+    prossima richiesta.
+
+    Senza display (modalità headless) le immagini vengono caricate senza
+    convert(): servono solo per le dimensioni di rect e hitbox.
+
+    All'avvio load_atlas() legge i fogli dell'atlante (atlas.py) e mette
+    in cache subsurface dei fogli; quando l'atlante va rifatto le immagini
+    vengono decodificate su un pool di thread (decode_images) e sul thread
+    principale resta solo frombuffer() + convert_alpha().
+    """
+
+    def __init__(self, max_images=None):
+        """
+        Args:
+            max_images: Numero massimo di immagini in cache (None = nessun limite)
+        """
+        self.max_images = max_images
+        self.images = OrderedDict()  # (path, alpha) -> Surface
+        self.folders = {}            # path -> lista dei percorsi delle immagini
+        self.fonts = {}              # (name, size) -> Font
+
+    def image(self, path, alpha=True):
+        """
+        Restituisce l'immagine in path, caricandola solo la prima volta.
+
+        Args:
+            path: Percorso del file
+            alpha: True per convert_alpha(), False per convert()
+        """
+        key = (path, alpha)
+        surface = self.images.get(key)
+        if surface is not None:
+            self.images.move_to_end(key)
+            return surface
+
+        return self._store(key, pygame.image.load(path))
+
+    def _store(self, key, surface):
+        """Converte per il display (se c'è) e mette in cache un'immagine appena decodificata"""
+        return self._insert(key, self._convert(surface, key[1]))
+
+    def _insert(self, key, surface):
+        """Mette in cache una Surface già pronta, scartando le meno usate oltre max_images"""
+        self.images[key] = surface
+        self.images.move_to_end(key)
+
+        if self.max_images is not None:
+            while len(self.images) > self.max_images:
+                self.images.popitem(last=False)
+
+        return surface
+
+    @staticmethod
+    def _convert(surface, alpha):
+        """convert_alpha()/convert() se c'è un display, altrimenti la Surface così com'è"""
+        if pygame.display.get_surface() is None:
+            return surface
+        return surface.convert_alpha() if alpha else surface.convert()
+
+    @staticmethod
+    def folder_paths(path):
+        """Percorsi delle immagini di una cartella, ordinati per nome"""
+        paths = []
+        for _,__,img_files in walk(path):
+            for image in sorted(img_files):
+                paths.append(path + '/' + image)
+        return paths
+
+    def folder(self, path):
+        """
+        Restituisce tutte le immagini di una cartella, ordinate per nome.
+
+        L'ordine conta: l'indice corrisponde all'id del tile in Tiled.
+        """
+        paths = self.folders.get(path)
+        if paths is None:
+            paths = self.folders[path] = self.folder_paths(path)
+        return [self.image(image_path) for image_path in paths]
+
+    def load_atlas(self, folders, progress=None):
+        """
+        Carica le immagini delle cartelle dall'atlante delle texture,
+        creandolo o aggiornandolo se serve.
+
+        Ogni immagine diventa una subsurface del suo foglio: image() e
+        folder() le restituiscono come prima. Se l'atlante va ricostruito,
+        le immagini vengono decodificate in parallelo (decode_images).
+
+        Args:
+            folders: Cartelle incluse nell'atlante
+            progress: Funzione progress(caricati, totale) per la UI: immagini
+                      decodificate (solo se l'atlante va rifatto), poi fogli caricati
+
+        Returns:
+            Numero di immagini caricate
+        """
+        paths = [path for folder in folders for path in self.folder_paths(folder)]
+        index = atlas_index(paths, decode=lambda sources: decode_images(sources, progress=progress))
+
+        total = len(index['sheets'])
+        if progress is not None:
+            progress(0, total)
+        sheets = []
+        for number, file in enumerate(index['sheets'], 1):
+            sheets.append(self._convert(pygame.image.load(f'{ATLAS_DIR}/{file}'), True))
+            if progress is not None:
+                progress(number, total)
+
+        for path, (sheet, x, y, width, height) in index['images'].items():
+            self._insert((path, True), sheets[sheet].subsurface((x, y, width, height)))
+
+        for folder in folders:
+            self.folders[folder] = self.folder_paths(folder)
+        return len(index['images'])
+
+    def font(self, name=None, size=24):
+        """Restituisce un font condiviso per (name, size)"""
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = pygame.font.Font(name, size)
+            self.fonts[key] = font
+        return font
+
+    def clear(self):
+        """Svuota tutte le cache"""
+        self.images.clear()
+        self.folders.clear()
+        self.fonts.clear()
+
+
+asset_manager = AssetManager(ASSET_CACHE_MAX_IMAGES)
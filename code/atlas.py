@@ -0,0 +1,157 @@
+"""
+Atlante delle texture.
+
+Impacchetta le immagini piccole (tiles, NPC, frame del player) in pochi
+fogli grandi con un indice path -> (foglio, rect). All'avvio si legge un
+solo PNG per foglio e ogni immagine diventa una subsurface del foglio.
+
+L'atlante sta in ATLAS_DIR e viene ricostruito quando cambia mtime o
+dimensione di una delle immagini sorgente.
+
+Uso (dalla cartella code/):
+    python atlas.py
+"""
+import json
+import os
+import pygame
+from settings import *
+
+ATLAS_VERSION = 1
+PADDING = 1  # Pixel vuoti tra le immagini di un foglio
+
+
+def source_stamp(paths):
+    """mtime e dimensione delle immagini: se cambiano l'atlante è da rifare"""
+    stamp = {}
+    for path in paths:
+        stat = os.stat(path)
+        stamp[path] = [stat.st_mtime_ns, stat.st_size]
+    return stamp
+
+
+def index_path(atlas_dir=ATLAS_DIR):
+    return f'{atlas_dir}/atlas.json'
+
+
+def load_rgba(path):
+    """Carica un'immagine come Surface RGBA senza display (la trasparenza del PNG diventa alpha)"""
+    surface = pygame.image.load(path)
+    return pygame.image.frombuffer(pygame.image.tobytes(surface, 'RGBA'), surface.get_size(), 'RGBA')
+
+
+def pack_shelves(sizes, sheet_size):
+    """
+    Impacchettamento a scaffali: immagini ordinate per altezza, messe in
+    righe da sinistra a destra; quando un foglio è pieno se ne apre un altro.
+
+    Args:
+        sizes: Dict chiave -> (larghezza, altezza)
+        sheet_size: Lato di un foglio in pixel
+
+    Returns:
+        Dict chiave -> (foglio, x, y)
+    """
+    placements = {}
+    sheet = 0
+    x = y = shelf_height = 0
+    for key in sorted(sizes, key=lambda key: (-sizes[key][1], -sizes[key][0], key)):
+        width, height = sizes[key]
+        if width > sheet_size or height > sheet_size:
+            raise ValueError(f"{key}: immagine più grande di un foglio dell'atlante ({sheet_size}px)")
+
+        # Riga piena: scaffale successivo
+        if x + width > sheet_size:
+            x = 0
+            y += shelf_height + PADDING
+            shelf_height = 0
+        # Foglio pieno: foglio successivo
+        if y + height > sheet_size:
+            sheet += 1
+            x = y = shelf_height = 0
+
+        placements[key] = (sheet, x, y)
+        x += width + PADDING
+        shelf_height = max(shelf_height, height)
+    return placements
+
+
+def build_atlas(paths, atlas_dir=ATLAS_DIR, sheet_size=ATLAS_SHEET_SIZE, decode=None):
+    """
+    Crea i fogli PNG e l'indice dell'atlante per le immagini indicate.
+
+    Args:
+        decode: Funzione decode(paths) -> coppie (path, Surface RGBA), es.
+                assets.decode_images (in parallelo); None = load_rgba una alla volta
+
+    Returns:
+        Indice dell'atlante (come salvato in atlas.json)
+    """
+    if decode is None:
+        images = {path: load_rgba(path) for path in paths}
+    else:
+        images = dict(decode(paths))
+    placements = pack_shelves({path: image.get_size() for path, image in images.items()}, sheet_size)
+
+    # Ogni foglio è alto solo quanto serve
+    sheet_count = max((sheet for sheet, _, _ in placements.values()), default=-1) + 1
+    heights = [0] * sheet_count
+    for path, (sheet, x, y) in placements.items():
+        heights[sheet] = max(heights[sheet], y + images[path].get_height())
+    sheets = [pygame.Surface((sheet_size, height), pygame.SRCALPHA) for height in heights]
+
+    index = {
+        'version': ATLAS_VERSION,
+        'sheet_size': sheet_size,
+        'stamp': source_stamp(paths),
+        'sheets': [],
+        'images': {}
+    }
+    for path, (sheet, x, y) in placements.items():
+        image = images[path]
+        # BLEND_RGBA_MAX su un foglio vuoto copia i pixel così come sono (alpha compreso)
+        sheets[sheet].blit(image, (x, y), special_flags=pygame.BLEND_RGBA_MAX)
+        index['images'][path] = [sheet, x, y, image.get_width(), image.get_height()]
+
+    os.makedirs(atlas_dir, exist_ok=True)
+    for number, surface in enumerate(sheets):
+        file = f'atlas_{number}.png'
+        temp_path = f'{atlas_dir}/atlas_{number}.tmp.png'
+        pygame.image.save(surface, temp_path)
+        os.replace(temp_path, f'{atlas_dir}/{file}')
+        index['sheets'].append(file)
+
+    # L'indice va scritto per ultimo: finché non c'è, i fogli non vengono usati
+    temp_path = index_path(atlas_dir) + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(temp_path, index_path(atlas_dir))
+    return index
+
+
+def atlas_index(paths, atlas_dir=ATLAS_DIR, sheet_size=ATLAS_SHEET_SIZE, decode=None):
+    """
+    Restituisce l'indice dell'atlante, ricostruendolo se manca o se le
+    immagini (o l'elenco delle immagini) sono cambiate.
+
+    Args:
+        decode: Decodifica da usare se va ricostruito (vedi build_atlas)
+    """
+    try:
+        with open(index_path(atlas_dir)) as f:
+            index = json.load(f)
+        if (index.get('version') == ATLAS_VERSION and index.get('sheet_size') == sheet_size
+                and index.get('stamp') == source_stamp(paths)
+                and all(os.path.exists(f'{atlas_dir}/{file}') for file in index['sheets'])):
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    return build_atlas(paths, atlas_dir, sheet_size, decode)
+
+
+if __name__ == '__main__':
+    from assets import AssetManager, decode_images
+
+    atlas_paths = [path for folder in ASSET_PRELOAD_FOLDERS for path in AssetManager.folder_paths(folder)]
+    built = build_atlas(atlas_paths, decode=decode_images)
+    print(f"Atlante: {len(built['images'])} immagini in {len(built['sheets'])} fogli ({ATLAS_DIR})")
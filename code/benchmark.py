@@ -0,0 +1,349 @@
+"""
+Benchmark dei tempi di caricamento, update e draw.
+
+Misura map load (solo Level + create_map, a mappa già compilata), update di un tick, custom_draw,
+Player.collision e apertura/disegno dei dialoghi sulla mappa reale e su
+mappe generate 4x, 16x e 64x più grandi. Usa il driver video 'dummy' di
+SDL, quindi gira anche in CI.
+
+Uso (dalla cartella code/):
+    python benchmark.py --output bench.json
+    python benchmark.py --scales 1 4 --compare bench.json
+    python benchmark.py --budget draw=4 --budget update=1
+    python benchmark.py --scales 1 --replay ../replays/partita.mlrec
+
+Con --replay una partita registrata (replay.py) viene rifatta senza
+display e ogni tick misurato come 'replay_update'.
+
+Esce con codice 1 se un p99 supera il suo budget.
+"""
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import csv
+import json
+import math
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import pygame
+from settings import *
+from assets import asset_manager
+from headless import HeadlessSimulation, KeyState
+from level import Level
+from map_compiler import load_map
+from replay import InputLog
+from text_cache import text_cache
+from time_manager import TimeManager
+
+# Budget di default sul p99, in millisecondi (None = nessun budget).
+# Tarati sul frame a 60 FPS (16.7 ms) con margine per una CI a un core, dove i
+# thread di caricamento (chunk, mappe) fanno picchi di ~5 ms (switch interval
+# del GIL): update e draw insieme devono stare in un frame. Le misure più
+# piccole (collision, dialoghi) hanno budget solo con --budget (es. collision=0.5)
+DEFAULT_BUDGETS_MS = {
+    'map_load': None,
+    'update': 7.0,
+    'draw': 9.5,
+    'collision': None,
+    'dialogue_open': None,
+    'dialogue_draw': None,
+    'replay_update': 7.0,
+}
+
+# Percorso ripetuto dal player durante le misure (tasto, tick)
+WALK_PATTERN = [
+    (pygame.K_LEFT, 40), (pygame.K_UP, 60), (pygame.K_RIGHT, 80), (pygame.K_DOWN, 120),
+    (pygame.K_LEFT, 60), (pygame.K_DOWN, 40), (pygame.K_RIGHT, 40), (pygame.K_UP, 60),
+]
+
+
+def percentile(samples, fraction):
+    """Percentile con interpolazione lineare (samples già ordinati)"""
+    if not samples:
+        return 0.0
+    position = (len(samples) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
+
+
+def summarize(samples_ns):
+    """Riassume una lista di tempi in nanosecondi (risultati in ms)"""
+    samples = sorted(sample / 1_000_000 for sample in samples_ns)
+    return {
+        'samples': len(samples),
+        'mean_ms': sum(samples) / len(samples) if samples else 0.0,
+        'p50_ms': percentile(samples, 0.50),
+        'p90_ms': percentile(samples, 0.90),
+        'p99_ms': percentile(samples, 0.99),
+        'max_ms': samples[-1] if samples else 0.0,
+    }
+
+
+def generate_scaled_map(source_dir, target_dir, map_name, factor):
+    """
+    Crea una mappa più grande ripetendo quella originale factor x factor volte.
+
+    Args:
+        source_dir: Cartella della mappa originale
+        target_dir: Cartella dove scrivere la mappa generata
+        map_name: Nome della mappa (file JSON di Tiled)
+        factor: Ripetizioni per lato (l'area cresce di factor²)
+    """
+    os.makedirs(target_dir, exist_ok=True)
+
+    height = 0
+    width = 0
+    for layout_name in ('collision', 'walkable_objects', 'obstacle_objects'):
+        with open(f'{source_dir}/{layout_name}.csv') as f:
+            rows = [row for row in csv.reader(f)]
+        height, width = len(rows), len(rows[0])
+        with open(f'{target_dir}/{layout_name}.csv', 'w', newline='') as f:
+            writer = csv.writer(f)
+            for _ in range(factor):
+                for row in rows:
+                    writer.writerow(row * factor)
+
+    # Pavimento ripetuto
+    floor = pygame.image.load(f'{source_dir}/floor_map.png')
+    floor_width, floor_height = floor.get_size()
+    big_floor = pygame.Surface((floor_width * factor, floor_height * factor))
+    for tile_y in range(factor):
+        for tile_x in range(factor):
+            big_floor.blit(floor, (tile_x * floor_width, tile_y * floor_height))
+    pygame.image.save(big_floor, f'{target_dir}/floor_map.png')
+
+    # NPC replicati in ogni copia della mappa
+    with open(f'{source_dir}/{map_name}.json') as f:
+        map_data = json.load(f)
+    npc_objects = []
+    for layer in map_data['layers']:
+        if layer['type'] == 'objectgroup' and layer['name'] == 'npc':
+            npc_objects = layer['objects']
+            break
+
+    objects = []
+    next_id = 1
+    for tile_y in range(factor):
+        for tile_x in range(factor):
+            for obj in npc_objects:
+                copy = dict(obj)
+                copy['id'] = next_id
+                copy['x'] = obj['x'] + tile_x * width * TILESIZE
+                copy['y'] = obj['y'] + tile_y * height * TILESIZE
+                objects.append(copy)
+                next_id += 1
+
+    generated = {
+        'width': width * factor,
+        'height': height * factor,
+        'tilewidth': TILESIZE,
+        'tileheight': TILESIZE,
+        'layers': [{'type': 'objectgroup', 'name': 'npc', 'objects': objects}],
+    }
+    with open(f'{target_dir}/{map_name}.json', 'w') as f:
+        json.dump(generated, f)
+
+
+class Benchmark:
+    """Esegue le misure su una mappa e raccoglie i campioni per metrica"""
+
+    def __init__(self, map_dir, map_name='npc_world', frames=600, load_repeats=5, dialogue_frames=30):
+        self.map_dir = map_dir
+        self.map_name = map_name
+        self.frames = frames
+        self.load_repeats = load_repeats
+        self.dialogue_frames = dialogue_frames
+
+    def load_level(self):
+        return Level(TimeManager(TIME_SPEED, START_TIME, END_TIME), self.map_name, map_dir=self.map_dir)
+
+    def run(self):
+        samples = {name: [] for name in DEFAULT_BUDGETS_MS}
+
+        # Compilazione della mappa (la prima volta, o dopo generate_scaled_map) fuori dalle misure
+        load_map(self.map_dir, self.map_name).close()
+
+        # Caricamento a freddo: svuoto le cache ogni volta, si misura solo Level(...)
+        level = None
+        for _ in range(self.load_repeats):
+            if level is not None:
+                level.close()
+            asset_manager.clear()
+            text_cache.clear()
+            asset_manager.load_atlas(ASSET_PRELOAD_FOLDERS)
+            start = time.perf_counter_ns()
+            level = self.load_level()
+            samples['map_load'].append(time.perf_counter_ns() - start)
+
+        player = level.player
+        screen = pygame.display.get_surface()
+        pattern = [key for key, ticks in WALK_PATTERN for _ in range(ticks)]
+
+        for frame in range(self.frames):
+            player.key_state = KeyState([pattern[frame % len(pattern)]])
+
+            start = time.perf_counter_ns()
+            level.update(TICK_TIME)
+            samples['update'].append(time.perf_counter_ns() - start)
+
+            screen.fill('black')
+            start = time.perf_counter_ns()
+            level.draw()
+            samples['draw'].append(time.perf_counter_ns() - start)
+
+            start = time.perf_counter_ns()
+            player.collision('horizontal')
+            player.collision('vertical')
+            samples['collision'].append(time.perf_counter_ns() - start)
+
+        # Dialoghi: apertura e disegno per i primi NPC della mappa
+        manager = level.dialogue_manager
+        for npc in list(level.npc_sprites)[:12]:
+            start = time.perf_counter_ns()
+            manager.start_dialogue(npc, loop_count=level.time_manager.loop_count, time=level.time_manager.current_time)
+            samples['dialogue_open'].append(time.perf_counter_ns() - start)
+            if not manager.active:
+                continue
+            for _ in range(self.dialogue_frames):
+                start = time.perf_counter_ns()
+                manager.draw(screen)
+                samples['dialogue_draw'].append(time.perf_counter_ns() - start)
+            manager.end_dialogue()
+
+        level.close()
+        return {name: summarize(values) for name, values in samples.items() if values}
+
+
+def run_replay(path):
+    """Rifà una partita registrata misurando ogni tick"""
+    log = InputLog(path)
+    simulation = HeadlessSimulation(log.map_name, log.time_speed, log.start_time, log.end_time)
+    samples = []
+    try:
+        for keydowns, state in log.frames():
+            for key in keydowns:
+                simulation.press(key)
+            simulation.key_state = state
+            start = time.perf_counter_ns()
+            simulation.step()
+            samples.append(time.perf_counter_ns() - start)
+    finally:
+        simulation.close()
+    return {'replay_update': summarize(samples)}
+
+
+def check_budgets(results, budgets):
+    """Restituisce la lista dei budget superati"""
+    failures = []
+    for map_label, metrics in results.items():
+        for metric, summary in metrics.items():
+            budget = budgets.get(metric)
+            if budget is not None and summary['p99_ms'] > budget:
+                failures.append({'map': map_label, 'metric': metric, 'p99_ms': summary['p99_ms'], 'budget_ms': budget})
+    return failures
+
+
+def print_results(results, baseline=None):
+    """Stampa una tabella dei risultati (con delta rispetto a baseline se presente)"""
+    for map_label, metrics in results.items():
+        print(f"\n== {map_label} ==")
+        for metric, summary in metrics.items():
+            line = f"  {metric:<14} mean {summary['mean_ms']:8.3f}  p50 {summary['p50_ms']:8.3f}  p99 {summary['p99_ms']:8.3f}  max {summary['max_ms']:8.3f} ms"
+            previous = (baseline or {}).get(map_label, {}).get(metric)
+            if previous and previous['p99_ms']:
+                delta = (summary['p99_ms'] - previous['p99_ms']) / previous['p99_ms'] * 100
+                line += f"  (p99 {delta:+.1f}%)"
+            print(line)
+
+
+def parse_budgets(values):
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for value in values:
+        name, _, limit = value.partition('=')
+        if name not in budgets:
+            raise SystemExit(f"Metrica sconosciuta per il budget: {name}")
+        budgets[name] = float(limit) if limit and limit != 'none' else None
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark di M-Loop')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16, 64],
+                        help='Moltiplicatori di area della mappa (1 = mappa reale)')
+    parser.add_argument('--frames', type=int, default=600, help='Tick/frame misurati per mappa')
+    parser.add_argument('--load-repeats', type=int, default=5, help='Caricamenti della mappa misurati')
+    parser.add_argument('--map-name', default='npc_world')
+    parser.add_argument('--output', help='File JSON dove salvare i risultati')
+    parser.add_argument('--compare', help='JSON di un run precedente da confrontare')
+    parser.add_argument('--budget', action='append', default=[], metavar='METRICA=MS',
+                        help="Budget p99 in ms (es: draw=8, 'none' per disattivarlo)")
+    parser.add_argument('--replay', action='append', default=[], metavar='FILE',
+                        help='Partita registrata (.mlrec) da rifare come carico di lavoro')
+    args = parser.parse_args(argv)
+
+    budgets = parse_budgets(args.budget)
+
+    pygame.init()
+    pygame.display.set_mode((WIDTH, HEIGTH))
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix='mloop_bench_')
+    try:
+        for scale in args.scales:
+            factor = math.isqrt(scale)
+            if factor * factor != scale:
+                raise SystemExit(f"Scala {scale} non valida: deve essere un quadrato (1, 4, 16, 64...)")
+
+            if factor == 1:
+                map_dir, label = MAP_DIR, args.map_name
+            else:
+                map_dir, label = f'{work_dir}/x{scale}', f'{args.map_name}_x{scale}'
+                generate_scaled_map(MAP_DIR, map_dir, args.map_name, factor)
+
+            benchmark = Benchmark(map_dir, args.map_name, frames=args.frames, load_repeats=args.load_repeats)
+            results[label] = benchmark.run()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for path in args.replay:
+        results[f'replay:{os.path.basename(path)}'] = run_replay(path)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    failures = check_budgets(results, budgets)
+    print_results(results, baseline)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'platform': platform.platform(),
+            'frames': args.frames,
+            'tick_rate': TICK_RATE,
+        },
+        'budgets_ms': budgets,
+        'results': results,
+        'failures': failures,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    for failure in failures:
+        print(f"BUDGET SUPERATO: {failure['map']} {failure['metric']} p99 {failure['p99_ms']:.3f} ms > {failure['budget_ms']} ms")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import operator
+
+# IMPORTANTE: gli operatori più lunghi (>=, <=) vanno controllati
+# prima di quelli più corti (>, <) per evitare match errati!
+OPERATORS = (
+    ('>=', operator.ge),
+    ('<=', operator.le),
+    ('>', operator.gt),
+    ('<', operator.lt),
+    ('==', operator.eq),
+)
+
+SELECTION_CACHE_SIZE = 256  # Combinazioni di contesto memorizzate per dialogo
+
+
+def parse_value(value):
+    """Converte una stringa in int, float, time (HH:MM) o stringa"""
+    # Prima rimuovi eventuali virgolette/spazi
+    value = str(value).strip()
+
+    try:
+        # Controlla se è un formato HH:MM (es: "12:00", "18:30")
+        if ':' in value:
+            hours, minutes = value.split(':')
+            return float(hours) + float(minutes) / 60.0
+
+        # Altrimenti prova numero con decimale
+        if '.' in value:
+            return float(value)
+
+        # Altrimenti prova intero
+        return int(value)
+    except ValueError:
+        # È una stringa, restituiscila così
+        return value
+
+
+class Condition:
+    """
+    Condizione di dialogo già compilata.
+
+    Supporta:
+    - Comparazioni: "loop_count > 3", "time >= 12:00"
+    - Booleani: "has_item_key", "quest_completed"
+    """
+
+    __slots__ = ('source', 'key', 'symbol', 'compare', 'value', 'default')
+
+    def __init__(self, source):
+        """
+        Args:
+            source: Testo della condizione come scritto in dialogues.json
+        """
+        self.source = source
+        self.symbol = None
+        self.compare = None
+        self.value = True
+        self.default = False
+
+        for symbol, compare in OPERATORS:
+            if symbol in source:
+                key, value = source.split(symbol)
+                self.key = key.strip()
+                self.symbol = symbol
+                self.compare = compare
+                self.value = parse_value(value)
+                # Le comparazioni numeriche partono da 0, l'uguaglianza da None
+                self.default = None if symbol == '==' else 0
+                return
+
+        # Condizione booleana semplice (es: "has_item_key")
+        self.key = source.strip()
+
+    def __call__(self, context):
+        value = context.get(self.key, self.default)
+        if self.compare is None:
+            return bool(value)
+        try:
+            return self.compare(value, self.value)
+        except TypeError:
+            return False
+
+    def specificity(self):
+        """
+        Ordine tra condizioni sulla stessa variabile: la più restrittiva prima.
+
+        "loop_count > 7" viene prima di "loop_count > 3", "time < 10:00"
+        prima di "time < 12:00" e le uguaglianze prima dei range.
+        """
+        if not isinstance(self.value, (int, float)) or isinstance(self.value, bool):
+            return 0
+        if self.symbol == '==':
+            return float('-inf')
+        if self.symbol in ('>', '>='):
+            return -self.value
+        if self.symbol in ('<', '<='):
+            return self.value
+        return 0
+
+    def __repr__(self):
+        return f"Condition({self.source!r})"
+
+
+class CompiledDialogue:
+    """
+    Dialogo con condizioni compilate e varianti già pronte.
+
+    Le varianti sono ordinate per priorità: un campo "priority" nella
+    variante vince, poi le condizioni sono raggruppate per variabile
+    (nell'ordine in cui compaiono) e ordinate dalla più restrittiva.
+    La scelta della variante è memorizzata per combinazione di valori
+    delle variabili usate, quindi di solito è una lookup in tabella.
+    """
+
+    def __init__(self, dialogue_id, data):
+        self.dialogue_id = dialogue_id
+        self.data = data
+        self.variants = []  # Lista di (Condition, dict del dialogo modificato)
+        self.cache = {}
+
+        groups = {}
+        entries = []
+        for index, (source, alternative) in enumerate(data.get('conditions', {}).items()):
+            condition = Condition(source)
+            priority = 0
+
+            # Crea una copia del dialogo con il testo alternativo
+            variant = dict(data)
+            if isinstance(alternative, str):
+                variant['text'] = alternative
+            elif isinstance(alternative, dict):
+                # Se alternative è un oggetto complesso, sostituisci completamente
+                alternative = dict(alternative)
+                priority = alternative.pop('priority', 0)
+                variant.update(alternative)
+
+            group = groups.setdefault(condition.key, len(groups))
+            entries.append(((-priority, group, condition.specificity(), index), condition, variant))
+
+        entries.sort(key=lambda entry: entry[0])
+        self.variants = [(condition, variant) for _, condition, variant in entries]
+        self.variables = tuple(groups)
+
+    def select(self, context):
+        """
+        Restituisce il dialogo da usare per il contesto di gioco.
+
+        Args:
+            context: Dict con loop_count, time, has_item_*, ecc.
+        """
+        if not self.variants:
+            return self.data
+
+        key = tuple(context.get(variable) for variable in self.variables)
+        try:
+            selected = self.cache.get(key)
+        except TypeError:
+            # Valori non hashabili nel contesto: niente cache
+            key = None
+            selected = None
+        if selected is not None:
+            return selected
+
+        selected = self.data
+        for condition, variant in self.variants:
+            if condition(context):
+                selected = variant
+                break
+
+        if key is not None:
+            if len(self.cache) >= SELECTION_CACHE_SIZE:
+                self.cache.clear()
+            self.cache[key] = selected
+        return selected
+
+
+def compile_dialogues(dialogues):
+    """
+    Compila tutti i dialoghi caricati da JSON.
+
+    Returns:
+        Tupla (dict dialogue_id -> CompiledDialogue,
+               dict variabile di contesto -> set di dialogue_id che la usano)
+    """
+    compiled = {}
+    index = {}
+    for dialogue_id, data in dialogues.items():
+        dialogue = CompiledDialogue(dialogue_id, data)
+        compiled[dialogue_id] = dialogue
+        for variable in dialogue.variables:
+            index.setdefault(variable, set()).add(dialogue_id)
+    return compiled, index
@@ -1,10 +1,205 @@
 import pygame
-pygame.init()
-font  = pygame.font.Font(None, 30)
+import csv
+import json
+import time
+from collections import deque
+from settings import *
+from assets import asset_manager
+from text_cache import text_cache
 
 def debug(info, y=10, x=10):
     display_surface = pygame.display.get_surface()
-    debug_surf = font.render(str(info), True, 'White')
+    debug_surf = text_cache.render(asset_manager.font(None, 30), str(info), 'White')
     debug_rect = debug_surf.get_rect(topleft = (x,y))
     pygame.draw.rect(display_surface, 'Black', debug_rect)
-    display_surface.blit(debug_surf, debug_rect)
\ No newline at end of file
+    display_surface.blit(debug_surf, debug_rect)
+
+
+class _Scope:
+    """Context manager riusabile che misura un sottosistema"""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add_sample(self.name, time.perf_counter_ns() - self.start)
+        return False
+
+
+class Profiler:
+    """
+    Tempi per sottosistema (input, player, collisioni, draw, dialoghi, HUD).
+
+    Ogni scope accumula il proprio tempo nel frame corrente; a fine frame
+    i totali entrano in una finestra mobile da cui si calcolano media e p99.
+    L'overlay (F3) mostra la tabella e il grafico dei tempi di frame;
+    la traccia (F4) salva un record per frame in CSV o JSON.
+    """
+
+    def __init__(self, window=PROFILER_WINDOW, enabled=PROFILER_ENABLED):
+        """
+        Args:
+            window: Numero di frame nella finestra mobile
+            enabled: Se False gli scope non misurano nulla
+        """
+        self.window = window
+        self.enabled = enabled
+        self.visible = False
+
+        self.scopes = {}          # name -> _Scope riusabile
+        self.current = {}         # name -> ns accumulati nel frame corrente
+        self.history = {}         # name -> deque di ms per frame
+        self.frame_times = deque(maxlen=window)
+        self.frame_start = None
+        self.frame_index = 0
+
+        # Traccia su file (None = non attiva)
+        self.trace = None
+        self.trace_path = None
+
+    def scope(self, name):
+        """
+        Restituisce il context manager che misura il sottosistema name.
+
+        Uso:
+            with profiler.scope('collision'):
+                ...
+        """
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = self.scopes[name] = _Scope(self, name)
+        return scope
+
+    def add_sample(self, name, elapsed_ns):
+        if self.enabled:
+            self.current[name] = self.current.get(name, 0) + elapsed_ns
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter_ns()
+
+    def end_frame(self):
+        """Chiude il frame: sposta i totali nella finestra mobile e nella traccia"""
+        if not self.enabled or self.frame_start is None:
+            self.current.clear()
+            return
+
+        frame_ms = (time.perf_counter_ns() - self.frame_start) / 1_000_000
+        self.frame_times.append(frame_ms)
+
+        for name in self.scopes:
+            elapsed_ms = self.current.get(name, 0) / 1_000_000
+            history = self.history.get(name)
+            if history is None:
+                history = self.history[name] = deque(maxlen=self.window)
+            history.append(elapsed_ms)
+
+        if self.trace is not None:
+            record = {'frame': self.frame_index, 'frame_ms': round(frame_ms, 4)}
+            for name in self.scopes:
+                record[name] = round(self.current.get(name, 0) / 1_000_000, 4)
+            self.trace.append(record)
+
+        self.current.clear()
+        self.frame_index += 1
+
+    def stats(self, name):
+        """
+        Returns:
+            Tupla (media ms, p99 ms) sulla finestra mobile
+        """
+        samples = self.frame_times if name == 'frame' else self.history.get(name, ())
+        if not samples:
+            return 0.0, 0.0
+        ordered = sorted(samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return sum(ordered) / len(ordered), p99
+
+    def toggle(self):
+        """Mostra/nasconde l'overlay"""
+        self.visible = not self.visible
+
+    def start_trace(self, path=PROFILER_TRACE_PATH):
+        """Inizia a registrare un record per frame (salvato da stop_trace)"""
+        self.trace = []
+        self.trace_path = path
+
+    def stop_trace(self):
+        """
+        Scrive la traccia su file: JSON se il percorso finisce in .json, altrimenti CSV.
+
+        Returns:
+            Il percorso del file scritto, oppure None se la traccia non era attiva
+        """
+        if self.trace is None:
+            return None
+
+        path, records = self.trace_path, self.trace
+        self.trace = None
+        self.trace_path = None
+
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump(records, f)
+        else:
+            fields = ['frame', 'frame_ms'] + list(self.scopes)
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=fields, restval=0)
+                writer.writeheader()
+                writer.writerows(records)
+        return path
+
+    def toggle_trace(self):
+        if self.trace is None:
+            self.start_trace()
+            print(f"Profiler: traccia avviata ({self.trace_path})")
+        else:
+            print(f"Profiler: traccia salvata in {self.stop_trace()}")
+
+    def draw(self, surface):
+        """Disegna tabella dei tempi e grafico dei frame (se l'overlay è visibile)"""
+        if not self.visible:
+            return
+
+        font = asset_manager.font(None, 20)
+        line_height = 18
+        names = ['frame'] + list(self.scopes)
+        graph_height = 60
+        width = 260
+        height = 30 + len(names) * line_height + graph_height
+
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+
+        header = text_cache.render(font, 'scope          avg     p99 (ms)', (200, 200, 220))
+        panel.blit(header, (8, 6))
+        for index, name in enumerate(names):
+            average, p99 = self.stats(name)
+            row = f"{name:<12} {average:7.2f} {p99:7.2f}"
+            color = (255, 120, 120) if name == 'frame' and p99 > 1000 / FPS else (255, 255, 255)
+            panel.blit(font.render(row, True, color), (8, 24 + index * line_height))
+
+        # Grafico dei tempi di frame: la linea indica il budget a FPS
+        graph_top = height - graph_height - 4
+        budget_ms = 1000 / FPS
+        scale = graph_height / (budget_ms * 2)
+        pygame.draw.line(panel, (255, 220, 100), (4, graph_top + graph_height - budget_ms * scale),
+                         (width - 4, graph_top + graph_height - budget_ms * scale))
+        bar_width = max(1, (width - 8) / self.window)
+        for index, frame_ms in enumerate(self.frame_times):
+            bar_height = min(graph_height, frame_ms * scale)
+            color = (120, 220, 120) if frame_ms <= budget_ms else (255, 120, 120)
+            bar = pygame.Rect(4 + index * bar_width, graph_top + graph_height - bar_height, max(1, bar_width), bar_height)
+            pygame.draw.rect(panel, color, bar)
+
+        surface.blit(panel, (10, 10))
+
+
+profiler = Profiler()
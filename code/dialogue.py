@@ -1,6 +1,8 @@
 import pygame
-import json
 from settings import *
+from assets import asset_manager
+from text_cache import text_cache
+from dialogue_store import DialogueStore
 
 class DialogueManager:
     """
@@ -13,8 +15,8 @@ class DialogueManager:
         self.current_npc = None
         self.initiated_by = 'player'  # 'player' o 'npc'
         
-        # Carica i dialoghi da JSON
-        self.dialogues = self.load_dialogues()
+        # Archivio dei dialoghi: gli shard vengono caricati (e compilati) al primo uso
+        self.dialogues = DialogueStore()
         
         # Riferimento al DialogueBox (verrà impostato dopo)
         self.dialogue_box = None
@@ -22,18 +24,6 @@ class DialogueManager:
         # Callback per quando il dialogo finisce
         self.on_dialogue_end = None
     
-    def load_dialogues(self):
-        """Carica tutti i dialoghi dal file JSON"""
-        try:
-            with open('../data/dialogues.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print("Warning: dialogues.json non trovato, creo struttura vuota")
-            return {}
-        except json.JSONDecodeError:
-            print("Errore: dialogues.json non è un JSON valido")
-            return {}
-    
     def start_dialogue(self, npc, dialogue_id=None, initiated_by='player', **kwargs):
         """
         Inizia un dialogo con un NPC.
@@ -51,15 +41,13 @@ class DialogueManager:
         if dialogue_id is None:
             dialogue_id = npc.dialogue_id
         
-        if dialogue_id is None or dialogue_id not in self.dialogues:
+        compiled_dialogue = self.dialogues.get(dialogue_id)
+        if compiled_dialogue is None:
             print(f"Warning: Dialogo '{dialogue_id}' non trovato")
             return
         
-        # Ottieni i dati del dialogo
-        dialogue_data = self.dialogues[dialogue_id]
-        
-        # Applica condizioni se presenti
-        dialogue_data = self._apply_conditions(dialogue_data, kwargs)
+        # Ottieni i dati del dialogo, con le condizioni già applicate
+        dialogue_data = compiled_dialogue.select(kwargs)
         
         # Attiva il dialogo
         self.active = True
@@ -85,97 +73,14 @@ class DialogueManager:
         else:
             self.dialogue_box = BasicDialogueBox(dialogue_data, npc)
     
-    def _apply_conditions(self, dialogue_data, context):
+    def dialogues_affected_by(self, variable):
         """
-        Applica condizioni al dialogo in base al contesto del gioco.
+        Restituisce gli id dei dialoghi che hanno condizioni sulla variabile.
         
-        Es: Se loop_count > 3, usa un dialogo diverso
+        Es: dialogues_affected_by('loop_count') -> {'merchant_intro', 'hermit_intro', ...}
+        Vale anche per gli shard non ancora caricati (indice in index.json).
         """
-        if 'conditions' not in dialogue_data:
-            return dialogue_data
-        
-        conditions = dialogue_data['conditions']
-        
-        # Controlla ogni condizione
-        for condition, alternative_text in conditions.items():
-            if self._evaluate_condition(condition, context):
-                # Crea una copia del dialogo con il testo alternativo
-                modified_dialogue = dialogue_data.copy()
-                if isinstance(alternative_text, str):
-                    modified_dialogue['text'] = alternative_text
-                elif isinstance(alternative_text, dict):
-                    # Se alternative_text è un oggetto complesso, sostituisci completamente
-                    modified_dialogue.update(alternative_text)
-                return modified_dialogue
-        
-        return dialogue_data
-    
-    def _evaluate_condition(self, condition, context):
-        """
-        Valuta una condizione.
-        
-        Supporta:
-        - Comparazioni: "loop_count > 3", "time >= 12:00"
-        - Booleani: "has_item_key", "quest_completed"
-        """
-        # IMPORTANTE: Controlla prima gli operatori più lunghi (>=, <=)
-        # poi quelli più corti (>, <) per evitare match errati!
-        
-        if '>=' in condition:
-            key, value = condition.split('>=')
-            key = key.strip()
-            value = value.strip()
-            return context.get(key, 0) >= self._parse_value(value)
-        
-        elif '<=' in condition:
-            key, value = condition.split('<=')
-            key = key.strip()
-            value = value.strip()
-            return context.get(key, 0) <= self._parse_value(value)
-        
-        elif '>' in condition:
-            key, value = condition.split('>')
-            key = key.strip()
-            value = value.strip()
-            return context.get(key, 0) > self._parse_value(value)
-        
-        elif '<' in condition:
-            key, value = condition.split('<')
-            key = key.strip()
-            value = value.strip()
-            return context.get(key, 0) < self._parse_value(value)
-        
-        elif '==' in condition:
-            key, value = condition.split('==')
-            key = key.strip()
-            value = value.strip()
-            return context.get(key) == self._parse_value(value)
-        
-        else:
-            # Condizione booleana semplice (es: "has_item_key")
-            return context.get(condition, False)
-
-    
-    def _parse_value(self, value):
-        """Converte una stringa in int, float, time (HH:MM) o stringa"""
-        # Prima rimuovi eventuali virgolette/spazi
-        value = str(value).strip()
-        
-        try:
-            # Controlla se è un formato HH:MM (es: "12:00", "18:30")
-            if ':' in value:
-                hours, minutes = value.split(':')
-                return float(hours) + float(minutes) / 60.0
-            
-            # Altrimenti prova numero con decimale
-            if '.' in value:
-                return float(value)
-            
-            # Altrimenti prova intero
-            return int(value)
-        except ValueError:
-            # È una stringa, restituiscila così
-            return value
+        return self.dialogues.dialogues_affected_by(variable)
     
     def end_dialogue(self, choice_result=None):
         """
@@ -239,8 +144,9 @@ class BasicDialogueBox:
         self.name_color = (255, 220, 100)
         
         # Font
-        self.font = pygame.font.Font(None, 28)
-        self.name_font = pygame.font.Font(None, 32)
+        self.font = asset_manager.font(None, 28)
+        self.name_font = asset_manager.font(None, 32)
+        self.indicator_font = asset_manager.font(None, 22)
         
         # Stato
         self.finished = False
@@ -260,7 +166,7 @@ class BasicDialogueBox:
         pygame.draw.rect(surface, self.border_color, box_rect, 3)
         
         # Nome NPC
-        name_surf = self.name_font.render(self.npc_name, True, self.name_color)
+        name_surf = text_cache.render(self.name_font, self.npc_name, self.name_color)
         surface.blit(name_surf, (self.box_x + 20, self.box_y + 15))
         
         # Testo del dialogo (word wrap)
@@ -271,36 +177,18 @@ class BasicDialogueBox:
         
         # Indicatore "Premi E per continuare"
         if self.can_close:
-            indicator_font = pygame.font.Font(None, 22)
-            indicator = indicator_font.render("Premi E per continuare", True, (150, 150, 150))
+            indicator = text_cache.render(self.indicator_font, "Premi E per continuare", (150, 150, 150))
             surface.blit(indicator, 
                         (self.box_x + self.box_width - 200, 
                          self.box_y + self.box_height - 30))
     
     def _draw_wrapped_text(self, surface, text, x, y, max_width):
-        """Disegna testo con word wrap"""
-        words = text.split(' ')
-        lines = []
-        current_line = []
-        
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            test_surf = self.font.render(test_line, True, self.text_color)
-            
-            if test_surf.get_width() <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                current_line = [word]
-        
-        if current_line:
-            lines.append(' '.join(current_line))
+        """Disegna testo con word wrap (righe calcolate una volta sola dal text cache)"""
+        lines = text_cache.wrap(self.font, text, self.text_color, max_width)
         
         # Disegna le linee
         line_height = 32
-        for i, line in enumerate(lines[:3]):  # Max 3 linee
-            line_surf = self.font.render(line, True, self.text_color)
+        for i, (line, line_surf) in enumerate(lines[:3]):  # Max 3 linee
             surface.blit(line_surf, (x, y + i * line_height))
     
     def handle_input(self, event):
@@ -338,11 +226,11 @@ class MultipleChoiceDialogueBox(BasicDialogueBox):
         pygame.draw.rect(surface, self.border_color, box_rect, 3)
         
         # Nome NPC
-        name_surf = self.name_font.render(self.npc_name, True, self.name_color)
+        name_surf = text_cache.render(self.name_font, self.npc_name, self.name_color)
         surface.blit(name_surf, (self.box_x + 20, self.box_y + 15))
         
         # Testo del dialogo
-        text_surf = self.font.render(self.text, True, self.text_color)
+        text_surf = text_cache.render(self.font, self.text, self.text_color)
         surface.blit(text_surf, (self.box_x + 20, self.box_y + 55))
         
         # Scelte
@@ -358,7 +246,7 @@ class MultipleChoiceDialogueBox(BasicDialogueBox):
                 color = (180, 180, 180)
                 prefix = "  "
             
-            choice_surf = self.font.render(f"{prefix}{choice_text}", True, color)
+            choice_surf = text_cache.render(self.font, f"{prefix}{choice_text}", color)
             surface.blit(choice_surf, (self.box_x + 40, choice_y + i * 35))
     
     def update(self):
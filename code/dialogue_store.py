@@ -0,0 +1,211 @@
+import json
+import os
+import pickle
+import struct
+from collections import OrderedDict
+from settings import *
+from conditions import compile_dialogues
+
+CACHE_VERSION = 2  # Da incrementare se cambia il formato dei pickle
+
+# Intestazione del pickle: magic, CACHE_VERSION, mtime_ns e dimensione del JSON.
+# Si confronta prima di unpickle, così una cache vecchia non viene mai deserializzata
+CACHE_MAGIC = b'MLDC'
+CACHE_HEADER = struct.Struct('<4sHqq')
+
+
+class DialogueStore:
+    """
+    Archivio dei dialoghi diviso in shard caricati su richiesta.
+
+    Se esiste DIALOGUE_SHARD_DIR/index.json, ogni dialogue_id viene cercato
+    nel suo shard (un file JSON per NPC o capitolo) e lo shard viene
+    caricato solo la prima volta che serve. Altrimenti dialogues.json
+    viene trattato come un unico shard, sempre caricato in modo pigro.
+
+    Gli shard usati di recente restano in memoria (LRU) e ogni shard ha
+    una versione compilata in pickle (cartella .cache) che viene rigenerata
+    quando il JSON cambia.
+    """
+
+    def __init__(self, path=DIALOGUE_PATH, shard_dir=DIALOGUE_SHARD_DIR, max_shards=DIALOGUE_MAX_SHARDS, use_cache=True):
+        """
+        Args:
+            path: dialogues.json singolo (usato se non ci sono shard)
+            shard_dir: Cartella con index.json e i file degli shard
+            max_shards: Numero massimo di shard tenuti in memoria
+            use_cache: Se True legge/scrive la versione compilata in pickle
+        """
+        self.max_shards = max_shards
+        self.use_cache = use_cache
+
+        self.shard_files = {}   # nome shard -> percorso JSON
+        self.shard_of = {}      # dialogue_id -> nome shard (None = da scoprire)
+        self.loaded = OrderedDict()  # nome shard -> dict dialogue_id -> CompiledDialogue
+        self.condition_index = None  # variabile -> set di dialogue_id (tutti gli shard, da index.json)
+
+        index_path = f'{shard_dir}/index.json'
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self.shard_files = {name: f'{shard_dir}/{file}' for name, file in index['shards'].items()}
+            self.shard_of = dict(index['dialogues'])
+            if 'conditions' in index:
+                self.condition_index = {variable: set(ids) for variable, ids in index['conditions'].items()}
+        elif os.path.exists(path):
+            self.shard_files = {'dialogues': path}
+        else:
+            print("Warning: dialogues.json non trovato, creo struttura vuota")
+
+    def __contains__(self, dialogue_id):
+        return self.get(dialogue_id) is not None
+
+    def get(self, dialogue_id):
+        """
+        Restituisce il CompiledDialogue con quell'id, caricando lo shard se serve.
+
+        Returns:
+            CompiledDialogue, oppure None se il dialogo non esiste
+        """
+        if dialogue_id is None:
+            return None
+
+        shard = self.shard_of.get(dialogue_id)
+        if shard is not None:
+            return self._shard(shard).get(dialogue_id)
+
+        # Senza indice (file unico) cerco negli shard non ancora caricati
+        if self.shard_of:
+            return None
+        for name in self.shard_files:
+            dialogue = self._shard(name).get(dialogue_id)
+            if dialogue is not None:
+                return dialogue
+        return None
+
+    def dialogues_affected_by(self, variable):
+        """Id dei dialoghi (di tutti gli shard, anche non caricati) con condizioni sulla variabile"""
+        if self.condition_index is None:
+            self.condition_index = self._build_condition_index()
+        return self.condition_index.get(variable, set())
+
+    def _build_condition_index(self):
+        """
+        Indice delle condizioni ricavato compilando gli shard: serve solo col
+        file unico (un solo shard) o con un index.json scritto prima che
+        split_dialogues salvasse anche le condizioni.
+        """
+        index = {}
+        for name in self.shard_files:
+            for dialogue_id, dialogue in self._shard(name).items():
+                for variable in dialogue.variables:
+                    index.setdefault(variable, set()).add(dialogue_id)
+        return index
+
+    def _shard(self, name):
+        """Restituisce uno shard compilato, caricandolo e aggiornando l'LRU"""
+        shard = self.loaded.get(name)
+        if shard is not None:
+            self.loaded.move_to_end(name)
+            return shard
+
+        shard = self._load_shard(self.shard_files[name])
+        self.loaded[name] = shard
+        while len(self.loaded) > self.max_shards:
+            self.loaded.popitem(last=False)
+
+        return shard
+
+    def _load_shard(self, path):
+        """Carica uno shard dal pickle se aggiornato, altrimenti dal JSON"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            print(f"Warning: shard dialoghi {path} non trovato")
+            return {}
+        header = CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+        cache_path = self._cache_path(path)
+
+        if self.use_cache:
+            try:
+                with open(cache_path, 'rb') as f:
+                    if f.read(CACHE_HEADER.size) == header:
+                        return pickle.load(f)
+            except OSError:
+                pass
+            except Exception as error:
+                # Pickle di classi rinominate o spostate: si ricompila dal JSON
+                print(f"Warning: cache dei dialoghi {cache_path} non valida ({error!r}), la rigenero")
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                dialogues = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Errore: {path} non è un JSON valido")
+            return {}
+
+        compiled, _ = compile_dialogues(dialogues)
+
+        if self.use_cache:
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                with open(cache_path, 'wb') as f:
+                    f.write(header)
+                    pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError as error:
+                print(f"Warning: impossibile salvare la cache dei dialoghi ({error})")
+
+        return compiled
+
+    @staticmethod
+    def _cache_path(path):
+        folder, file = os.path.split(path)
+        return os.path.join(folder, '.cache', os.path.splitext(file)[0] + '.pickle')
+
+
+def shard_key(dialogue_id, data):
+    """
+    Shard di un dialogo: il campo "shard" (es. un capitolo) se presente,
+    altrimenti l'NPC ricavato dall'id ('merchant_intro' -> 'merchant').
+    """
+    if 'shard' in data:
+        return data['shard']
+    return dialogue_id.rsplit('_', 1)[0] if '_' in dialogue_id else dialogue_id
+
+
+def split_dialogues(path=DIALOGUE_PATH, shard_dir=DIALOGUE_SHARD_DIR):
+    """
+    Divide dialogues.json in shard per NPC/capitolo e scrive index.json
+    (shard di ogni dialogo e indice variabile -> dialoghi delle condizioni).
+
+    Returns:
+        Dict nome shard -> numero di dialoghi
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        dialogues = json.load(f)
+
+    shards = {}
+    for dialogue_id, data in dialogues.items():
+        shards.setdefault(shard_key(dialogue_id, data), {})[dialogue_id] = data
+
+    os.makedirs(shard_dir, exist_ok=True)
+    _, conditions = compile_dialogues(dialogues)
+    index = {'shards': {}, 'dialogues': {}, 'conditions': {variable: sorted(ids) for variable, ids in conditions.items()}}
+    for name, shard in shards.items():
+        file = f'{name}.json'
+        with open(f'{shard_dir}/{file}', 'w', encoding='utf-8') as f:
+            json.dump(shard, f, ensure_ascii=False, indent=2)
+        index['shards'][name] = file
+        for dialogue_id in shard:
+            index['dialogues'][dialogue_id] = name
+
+    with open(f'{shard_dir}/index.json', 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+    return {name: len(shard) for name, shard in shards.items()}
+
+
+if __name__ == '__main__':
+    # python dialogue_store.py -> divide data/dialogues.json in data/dialogues/
+    for name, count in split_dialogues().items():
+        print(f"{name}: {count} dialoghi")
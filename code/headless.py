@@ -0,0 +1,149 @@
+import math
+import pygame
+from settings import *
+from map_manager import MapManager
+from time_manager import TimeManager
+
+class KeyState:
+    """
+    Sostituto di pygame.key.get_pressed() per la simulazione senza display.
+
+    Si indicizza con le costanti pygame.K_* come l'originale.
+    """
+
+    def __init__(self, pressed=()):
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+class HeadlessSimulation:
+    """
+    Simulazione del gioco senza finestra e senza rendering.
+
+    Carica mappa, collisioni e NPC come il gioco normale e avanza
+    TimeManager e la logica di update a passo fisso. Serve per testare
+    in batch i percorsi dei loop, per i benchmark in CI e per la
+    validazione lato server su macchine senza GPU.
+
+    run_loops salta i tratti in cui cambia solo l'orologio (nessun tasto,
+    dialogo o NPC in movimento), così una mappa ferma gira a migliaia di
+    loop al secondo; con fast_forward=False ogni tick viene simulato.
+    """
+
+    def __init__(self, map_name='npc_world', time_speed=TIME_SPEED, start_time=START_TIME, end_time=END_TIME):
+        """
+        Args:
+            map_name: Mappa da caricare
+            time_speed, start_time, end_time: Parametri del TimeManager
+        """
+        # Nessun set_mode: servono solo i moduli (font per gli NPC e i dialoghi)
+        pygame.init()
+
+        self.time_manager = TimeManager(time_speed=time_speed, start_time=start_time, end_time=end_time, verbose=False)
+        # Come nel gioco: le porte portano ad altre mappe
+        self.map_manager = MapManager(self.time_manager, map_name, headless=True)
+        self.key_state = KeyState()
+        self.level.player.key_state = self.key_state
+        self.ticks = 0
+
+    @property
+    def level(self):
+        """Livello della mappa corrente"""
+        return self.map_manager.level
+
+    def set_keys(self, pressed=()):
+        """Imposta i tasti tenuti premuti dal player (costanti pygame.K_*)"""
+        self.key_state = KeyState(pressed)
+        self.level.player.key_state = self.key_state
+
+    def press(self, key):
+        """Invia un KEYDOWN come Game.run (dialoghi, interazione con gli NPC)"""
+        self.level.handle_keydown(pygame.event.Event(pygame.KEYDOWN, key=key))
+
+    def step(self, ticks=1, delta_time=TICK_TIME):
+        """
+        Avanza la simulazione.
+
+        Args:
+            ticks: Numero di tick da simulare
+            delta_time: Durata di ogni tick in secondi
+        """
+        for _ in range(ticks):
+            # Dopo una porta il player è quello del nuovo livello
+            self.level.player.key_state = self.key_state
+            self.map_manager.update(delta_time)
+            self.ticks += 1
+
+    def close(self):
+        """Ferma i thread di precaricamento delle mappe"""
+        self.map_manager.shutdown()
+
+    def is_idle(self):
+        """True se nel mondo cambia solo l'orologio: nessun tasto, dialogo o NPC in movimento"""
+        level = self.level
+        return (not self.key_state.pressed
+                and not self.time_manager.paused
+                and not level.dialogue_manager.active
+                and not level.npc_movement.active.size
+                and not level.player.direction.length_squared())
+
+    def fast_forward(self, delta_time=TICK_TIME):
+        """
+        Se il mondo è fermo salta i tick fino a quello prima del prossimo
+        evento dello schedule (o della fine del loop): quel tick e i
+        successivi li simula step() come sempre.
+
+        Returns:
+            Int: Tick saltati
+        """
+        if not self.is_idle():
+            return 0
+        time_manager = self.time_manager
+        hours = max(1, math.ceil(time_manager.next_event_time() - time_manager.current_time))
+        remaining = hours * time_manager.time_speed - time_manager.accumulated_time
+        skipped = int(remaining / delta_time) - 1
+        if skipped <= 0:
+            return 0
+        time_manager.skip(skipped * delta_time)
+        self.ticks += skipped
+        return skipped
+
+    def run_loops(self, loops=1, delta_time=TICK_TIME, fast_forward=True):
+        """
+        Simula loop temporali completi.
+
+        Args:
+            loops: Numero di loop da completare
+            delta_time: Durata di ogni tick (default: TICK_TIME, come nel gioco)
+            fast_forward: Se True i tratti in cui il mondo è fermo vengono
+                          saltati (fast_forward), altrimenti si simula ogni tick
+
+        Returns:
+            Int: Tick simulati (compresi quelli saltati)
+        """
+        start_ticks = self.ticks
+        target_loop = self.time_manager.loop_count + loops
+        while self.time_manager.loop_count < target_loop:
+            if fast_forward:
+                self.fast_forward(delta_time)
+            self.step(1, delta_time)
+        return self.ticks - start_ticks
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    # Uso: python headless.py [loop] [--every-tick]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    fast_forward = '--every-tick' not in sys.argv
+    loops = int(args[0]) if args else (1000 if fast_forward else 5)
+
+    simulation = HeadlessSimulation()
+    start = time.perf_counter()
+    ticks = simulation.run_loops(loops, fast_forward=fast_forward)
+    elapsed = time.perf_counter() - start
+    print(f"{loops} loop ({ticks} tick) in {elapsed:.3f}s: {loops / elapsed:.0f} loop/s, {ticks / elapsed:.0f} tick/s")
+    simulation.close()
@@ -0,0 +1,91 @@
+import pygame
+from abc import ABC, abstractmethod
+from settings import *
+from text_cache import text_cache
+
+class HudWidget(ABC):
+    """
+    Base per i widget dell'interfaccia (HUD).
+
+    Un widget tiene la propria Surface già composta e la ricostruisce solo
+    quando cambia il valore che mostra (get_key). Dopo update(), dirty e
+    dirty_rect dicono se e dove lo schermo va ridisegnato.
+    """
+
+    def __init__(self, position):
+        """
+        Args:
+            position: Angolo in alto a sinistra del widget sullo schermo
+        """
+        self.position = position
+        self.surface = None
+        self.rect = pygame.Rect(position, (0, 0))
+        self.dirty = True
+        self.dirty_rect = None
+        self._key = None
+
+    @abstractmethod
+    def get_key(self):
+        """Valore che determina l'aspetto del widget"""
+
+    @abstractmethod
+    def compose(self, key):
+        """Costruisce la Surface del widget per il valore key"""
+
+    def update(self):
+        """
+        Ricompone il widget se il suo valore è cambiato.
+
+        Returns:
+            Bool: True se la Surface è stata ricostruita
+        """
+        key = self.get_key()
+        if self.surface is not None and key == self._key:
+            self.dirty = False
+            self.dirty_rect = None
+            return False
+
+        old_rect = self.rect
+        self._key = key
+        self.surface = self.compose(key)
+        self.rect = self.surface.get_rect(topleft=self.position)
+
+        # L'area da ridisegnare copre sia la vecchia che la nuova posizione
+        self.dirty_rect = self.rect.union(old_rect) if old_rect.width and old_rect.height else self.rect.copy()
+        self.dirty = True
+        return True
+
+    def draw(self, screen):
+        """Aggiorna (se serve) e disegna il widget"""
+        self.update()
+        screen.blit(self.surface, self.rect)
+
+
+class ClockWidget(HudWidget):
+    """Orologio HH:MM in alto a destra, ricomposto solo quando cambia l'ora mostrata"""
+
+    def __init__(self, time_manager, font, position=TIMER_POSITION, padding=10):
+        super().__init__(position)
+        self.time_manager = time_manager
+        self.font = font
+        self.padding = padding
+
+    def get_key(self):
+        return self.time_manager.format_time()
+
+    def compose(self, time_text):
+        text_surface = text_cache.render(self.font, time_text, TIMER_TEXT_COLOR)
+        text_rect = text_surface.get_rect()
+
+        # Box per il timer
+        box_width = text_rect.width + self.padding * 2
+        box_height = text_rect.height + self.padding * 2
+
+        # Background semi-trasparente con bordo
+        surface = pygame.Surface((box_width, box_height), pygame.SRCALPHA)
+        pygame.draw.rect(surface, TIMER_BG_COLOR, surface.get_rect(), border_radius=5)
+        pygame.draw.rect(surface, TIMER_BORDER_COLOR, surface.get_rect(), width=2, border_radius=5)
+
+        # Testo centrato nel box
+        surface.blit(text_surface, (self.padding, self.padding))
+        return surface
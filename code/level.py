@@ -1,118 +1,179 @@
 import pygame
-import json
+from bisect import bisect_left, bisect_right
+from heapq import merge
 from settings import *
-from tile import Tile
 from player import Player
 from npc import NPC
 from support import *
 from dialogue import DialogueManager
+from world_chunks import ChunkManager
+from spatial_grid import SpatialGrid
+from npc_movement import NPCMovementSystem
+from navigation import NavigationGrid
+from snapshot import WorldSnapshot
+from debug import profiler
+from map_compiler import load_level_data
 
 class Level:
-    def __init__(self, time_manager, map_name='npc_world'):
-        """map_name: nome della mappa da caricare (es: 'world', 'house1', 'church')"""
+    def __init__(self, time_manager, map_name='npc_world', headless=False, map_dir=None, level_data=None, player_pos=PLAYER_SPAWN):
+        """
+        map_name: nome della mappa da caricare (es: 'world', 'house1', 'church')
+        headless: se True carica mappa, collisioni e NPC senza display né rendering
+        map_dir: cartella che contiene i file della mappa (default: map_directory(map_name))
+        level_data: LevelData già caricato (es. da MapManager in background)
+        player_pos: posizione iniziale del player
+        """
         
-        # get the display surface
-        self.display_surface = pygame.display.get_surface()
+        # File I/O e parsing (saltati se la mappa è stata precaricata)
+        if level_data is None:
+            level_data = load_level_data(map_name, map_dir)
+        
+        # get the display surface (None in modalità headless)
+        self.headless = headless
+        self.display_surface = None if headless else pygame.display.get_surface()
 
         # Nome mappa corrente
-        self.map_name = map_name
+        self.map_name = level_data.map_name
+        self.map_dir = level_data.map_dir
+        self.map_data = level_data.map
 
         # Time manager
         self.time_manager = time_manager
 
         # sprite group setup
-        self.visible_sprites = YSortCameraGroup()
-        self.obstacle_sprites = pygame.sprite.Group()
+        self.visible_sprites = YSortCameraGroup(headless)
         self.npc_sprites = pygame.sprite.Group()
 
+        # Mondo a chunk: pavimento, tiles e collisioni statiche solo attorno al player.
+        # Fa anche da indice delle collisioni (stessa interfaccia di SpatialGrid, NPC compresi)
+        self.chunks = ChunkManager(level_data, self.visible_sprites, headless)
+        self.obstacle_grid = self.chunks
+
+        # Indice degli NPC per trovare quelli vicini al player
+        self.npc_grid = SpatialGrid()
+        self.npc_lookup = {}  # id(npc.rect) -> NPC
+
         # Dialogue system
         self.dialogue_manager = DialogueManager()
 
         # sprite setup
-        self.create_map()
+        self.create_map(player_pos)
         self.player_spawn = (self.player.rect.x, self.player.rect.y)
 
-    def create_map(self):
-        """Carica la mappa usando approccio IBRIDO: CSV per tiles + JSON per NPC"""
-
-        layouts = {
-            'boundary': import_csv_layout('../map/collision.csv'),
-            'walkable_objects': import_csv_layout('../map/walkable_objects.csv'),
-            'obstacle_objects': import_csv_layout('../map/obstacle_objects.csv')
-        }
-
-        graphics = {
-            'walkable_objects' : import_folder('../graphics/walkable_objects'),
-            'obstacle_objects' : import_folder('../graphics/obstacle_objects')
-        }
-        for style, layout in layouts.items():
-            for row_index, row in enumerate(layout):
-                for col_index, col in enumerate(row):
-                    if col != '-1':
-                        x = col_index * TILESIZE
-                        y = row_index * TILESIZE
-                        if style == 'boundary':
-                            Tile((x,y), [self.obstacle_sprites], 'invisible')
-                        if style == 'walkable_objects':
-                            surf = graphics['walkable_objects'][int(col)]
-                            Tile((x,y), [self.visible_sprites], 'walkable_objects', surf)
-                        if style == 'obstacle_objects':
-                            surf = graphics['obstacle_objects'][int(col)]
-                            Tile((x,y), [self.visible_sprites, self.obstacle_sprites], 'obstacle_objects', surf)
-
-        self.load_npcs_from_json()
-
-        self.player = Player((685,210), [self.visible_sprites], self.obstacle_sprites)
-
-    def load_npcs_from_json(self):
-        """Carica SOLO gli NPC dal JSON"""
-
-        try:
-            # Carica il file JSON
-            with open(f'../map/{self.map_name}.json') as f:
-                map_data = json.load(f)
-            
-            # Cerca il layer 'npc'
-            for layer in map_data['layers']:
-                if layer['type'] == 'objectgroup' and layer['name'] == 'npc':
-                    # Crea gli NPC
-                    for obj in layer['objects']:
-                        pos = (obj['x'], obj['y'])
-                        
-                        npc_type = obj.get('class', obj.get('type', 'unknown')) # Tiled può usare 'class' o 'type' a seconda della versione
-                        
-                        # Dati base NPC
-                        npc_data = {
-                            'type': npc_type,
-                            'name': obj.get('name', f'NPC_{obj.get("id", 0)}'),
-                            'movement': 'static', #leggo il campo 'movement', se non esite uso static come default
-                            'dialogue_id': None,
-                            'waypoints': [],
-                            'speed': 2
-                        }
-                        
-                        # Se in futuro aggiungi properties, le legge da qui
-                        if 'properties' in obj:
-                            for prop in obj['properties']:
-                                prop_name = prop['name']
-                                prop_value = prop['value']
-                                
-                                if prop_name == 'movement':
-                                    npc_data['movement'] = prop_value
-                                elif prop_name == 'dialogue_id':
-                                    npc_data['dialogue_id'] = prop_value
-                                elif prop_name == 'speed':
-                                    npc_data['speed'] = int(prop_value)
-                        
-                        # Crea NPC
-                        NPC(pos, [self.visible_sprites, self.obstacle_sprites, self.npc_sprites], npc_data)
-                                          
-                    break  # Layer NPC trovato, esci dal loop
-        
-        except FileNotFoundError:
-            print(f"Warning: {self.map_name}.json non trovato, nessun NPC caricato")
-        except json.JSONDecodeError:
-            print(f"Errore: {self.map_name}.json non è un JSON valido")
+        # Stato a inizio loop, ripristinato a ogni reset del TimeManager
+        self.snapshot = WorldSnapshot(self)
+        self.loop_count = time_manager.loop_count
+
+    def create_map(self, player_pos=PLAYER_SPAWN):
+        """
+        Costruisce la mappa dal file compilato (map_compiler): spawn degli NPC,
+        porte verso altre mappe e chunk attorno al player (tiles, pavimento e
+        rect di collisione già uniti arrivano dal ChunkManager)
+        """
+
+        # Layer NumPy: fonte unica per le ricerche sulla mappa (costruzione dei chunk, percorsi)
+        self.layers = self.map_data.layers
+
+        self.load_npcs(self.map_data.npc_spawns)
+
+        # Gli NPC si muovono: stanno nella griglia condivisa, non in quella dei chunk
+        for npc in self.npc_sprites:
+            self.obstacle_grid.insert(npc.hitbox)
+            self.npc_grid.insert(npc.rect)
+            self.npc_lookup[id(npc.rect)] = npc
+
+        # Percorsi degli NPC: collisioni + hitbox dei tiles ostacolo, flow field per le destinazioni
+        obstacle_sizes = [surf.get_size() for surf in self.chunks.graphics['obstacle_objects']]
+        self.navigation = NavigationGrid(self.layers, obstacle_sizes, self.map_data.destinations)
+        self.navigation.precompute_destinations()
+
+        # Patrol e wander di tutti gli NPC in un solo passo per tick
+        self.npc_movement = NPCMovementSystem(self.npc_sprites, self.navigation, self.obstacle_grid, self.npc_grid)
+
+        # Routine degli NPC nella coda globale del TimeManager
+        for npc in self.npc_sprites:
+            if npc.schedule:
+                self.time_manager.schedule.add_routine(self, npc, npc.schedule)
+
+        # Porte verso altre mappe
+        self.doors = [
+            {'rect': pygame.Rect(door['rect']), 'target_map': door['target_map'], 'target_pos': door['target_pos']}
+            for door in self.map_data.doors
+        ]
+
+        self.player = Player(player_pos, [self.visible_sprites], self.obstacle_grid)
+
+        # I chunk attorno al player servono subito, gli altri arrivano in background
+        self.chunks.update(self.player.hitbox.center, block=True)
+
+    def set_blocked(self, rect, blocked=True):
+        """
+        Blocca o libera un'area per gli NPC (es. muragliaPortaChiusa che si
+        chiude o si apre): navigazione e percorsi in corso vengono aggiornati.
+        """
+        self.npc_movement.obstacles_changed(rect, blocked)
+
+    def door_at(self, rect, ignore=None):
+        """
+        Restituisce la porta che tocca rect (es. la hitbox del player), se c'è.
+
+        Args:
+            ignore: Porta da non considerare (es. quella su cui il player è appena arrivato)
+        """
+        for door in self.doors:
+            if door['rect'].colliderect(rect) and (ignore is None or door['rect'] != ignore['rect']):
+                return door
+        return None
+
+    def load_npcs(self, npc_spawns):
+        """
+        Crea gli NPC dagli spawn letti dal layer 'npc' di Tiled.
+
+        Args:
+            npc_spawns: Lista di dict {'pos': (x, y), 'data': npc_data}
+        """
+        for spawn in npc_spawns:
+            NPC(tuple(spawn['pos']), [self.visible_sprites, self.npc_sprites], spawn['data'])
+
+    def sync_loop(self):
+        """
+        Se il TimeManager ha iniziato un nuovo loop, riporta il mondo allo
+        stato di inizio loop (player allo spawn, NPC, dialogo, porte).
+        Vale anche per i livelli in cache che tornano correnti.
+        """
+        if self.loop_count == self.time_manager.loop_count:
+            return
+        self.loop_count = self.time_manager.loop_count
+        with profiler.scope('snapshot'):
+            self.snapshot.restore(self)
+
+    def apply_schedule(self, events):
+        """
+        Applica gli eventi dello schedule scaduti (chiamato dal TimeManager).
+
+        Args:
+            events: Eventi (ora, ordine, owner, npc, entry) in ordine di ora
+        """
+        # Gli eventi del nuovo loop partono dal mondo ripristinato
+        self.sync_loop()
+
+        # Se un NPC ha più eventi scaduti vale l'ultimo luogo
+        locations = {}
+        for _, _, _, npc, entry in events:
+            if entry['activity'] is not None:
+                npc.activity = entry['activity']
+            if entry['dialogue_id'] is not None:
+                npc.dialogue_id = entry['dialogue_id']
+            if entry['location'] is not None:
+                locations[npc] = entry['location']
+
+        # NPC diretti nello stesso posto: un solo send_to (stesso flow field)
+        groups = {}
+        for npc, location in locations.items():
+            groups.setdefault(location, []).append(npc)
+        for location, npcs in groups.items():
+            if not self.npc_movement.send_to(npcs, location):
+                print(f"Warning: Destinazione '{location}' non trovata o non raggiungibile")
 
     def handle_interaction(self):
         """Gestisce l'interazione del player con gli NPC"""
@@ -124,69 +185,236 @@ class Level:
                 initiated_by='player',
                 loop_count=self.time_manager.loop_count,
                 time=self.time_manager.current_time,
+                activity=self.player.nearby_npc.activity,
                 has_item_newspaper=False  # TODO: Collegare all'inventario
             )
             
             # Blocca il movimento del player durante il dialogo
             self.player.can_move = False
 
-    def run(self):
+    def handle_keydown(self, event):
+        """
+        Gestisce un KEYDOWN (da Game.run o da un replay): input del dialogo
+        attivo, altrimenti E per parlare con l'NPC vicino.
+        """
+        if self.dialogue_manager.active:
+            self.dialogue_manager.handle_input(event)
+        elif event.key == pygame.K_e:
+            self.handle_interaction()
+
+    def update(self, delta_time):
+        """
+        Avanza la simulazione di un tick.
+
+        Args:
+            delta_time: Durata del tick in secondi (TICK_TIME)
+        """
+        # Il tempo di gioco usa lo stesso clock della simulazione
+        self.time_manager.update(delta_time)
 
         # Check se il loop è appena resetato
         if self.time_manager.just_reset:
-            # Riporta il player allo spawn
-            self.player.rect.x, self.player.rect.y = self.player_spawn
-            self.player.hitbox.center = self.player.rect.center
+            self.sync_loop()
             
             # Resetta il flag
             self.time_manager.just_reset = False
             
         # Controlla NPC vicini per interazione
-        self.player.check_nearby_npcs(self.npc_sprites)
+        self.player.check_nearby_npcs(self.npc_grid, self.npc_lookup)
         
-        # update and draw the game
-        self.visible_sprites.custom_draw(self.player)
+        # update the game
         self.visible_sprites.update()
+
+        # Gli NPC si fermano durante i dialoghi
+        if not self.dialogue_manager.active:
+            with profiler.scope('npc'):
+                self.npc_movement.update()
+
+        # Carica/scarica i chunk attorno al player
+        with profiler.scope('chunks'):
+            self.chunks.update(self.player.hitbox.center)
         
-        # Aggiorna e disegna il dialogo se attivo
+        # Aggiorna il dialogo se attivo
         if self.dialogue_manager.active:
             self.time_manager.pause()
-            self.dialogue_manager.update()
-            self.dialogue_manager.draw(self.display_surface)
+            with profiler.scope('dialogue'):
+                self.dialogue_manager.update()
         else:
             # Sblocca il movimento quando il dialogo finisce
             self.time_manager.resume()
             self.player.can_move = True
 
+    def draw(self, alpha=1.0):
+        """
+        Disegna il livello.
+
+        Args:
+            alpha: Frazione di tick trascorsa dall'ultimo update (0-1),
+                   usata per interpolare la posizione degli sprite in movimento
+        """
+        with profiler.scope('custom_draw'):
+            self.visible_sprites.custom_draw(self.player, alpha)
+        
+        # Disegna il dialogo se attivo
+        if self.dialogue_manager.active:
+            with profiler.scope('dialogue'):
+                self.dialogue_manager.draw(self.display_surface)
+
+    def close(self):
+        """
+        Libera il livello quando non serve più (es. scaricato da MapManager):
+        annulla i chunk in caricamento, toglie la routine degli NPC dallo
+        schedule e chiude la mappa compilata (mmap e file).
+        """
+        self.chunks.close()
+        self.time_manager.schedule.remove_owner(self)
+        # I layer sono viste sull'mmap: finché esistono la mappa non si può chiudere
+        self.layers = {}
+        self.map_data.close()
+
 
 class YSortCameraGroup(pygame.sprite.Group):
-    def __init__(self):
+    """
+    Gruppo che disegna gli sprite ordinati per y rispetto alla camera.
+
+    Il pavimento e i tiles calpestabili sono pre-renderizzati in chunk
+    (floor_chunks, riempito dal ChunkManager); i tiles statici vengono
+    tenuti ordinati per y (add_static), mentre ogni frame si riordinano
+    solo gli sprite in movimento (Player, NPC). Tutto cio' che sta fuori
+    dalla camera viene saltato.
+
+    In modalità headless il gruppo tiene solo gli sprite (per update e
+    collisioni) e non disegna nulla.
+    """
+    def __init__(self, headless=False):
 
         # general setup
         super().__init__()
-        self.display_surface = pygame.display.get_surface()
-        self.half_width = self.display_surface.get_size()[0] // 2
-        self.half_heigth = self.display_surface.get_size()[1] // 2
+        self.display_surface = None if headless else pygame.display.get_surface()
+        screen_size = (WIDTH, HEIGTH) if headless else self.display_surface.get_size()
+        self.half_width = screen_size[0] // 2
+        self.half_heigth = screen_size[1] // 2
         self.offset = pygame.math.Vector2()
+        self.camera_rect = pygame.Rect((0, 0), screen_size)
+
+        # Tiles calpestabili animati, disegnati sopra i chunk
+        self.animated_sprites = []
+
+        # Layer statico ordinato per centery + chiavi per la ricerca binaria
+        self.static_sprites = []
+        self.static_keys = []
+        self.static_margin = 0  # Altezza massima di un tile statico
+
+        # Sprite che possono muoversi (riordinati ogni frame)
+        self.moving_sprites = []
+
+        # the floor: chunk da CHUNK_SIZE caricati solo attorno al player
+        self.floor_rect = pygame.Rect(0, 0, 0, 0)
+        self.floor_chunks = {}  # (col, row) -> Surface
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.moving_sprites.append(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        if sprite in self.moving_sprites:
+            self.moving_sprites.remove(sprite)
+        else:
+            index = self.static_sprites.index(sprite)
+            del self.static_sprites[index]
+            del self.static_keys[index]
+
+    def build_static_layer(self, sprites):
+        """
+        Sposta gli sprite indicati nel layer statico, ordinato per y.
+
+        Args:
+            sprites: Sprite del gruppo che non si muoveranno piu' (tiles)
+        """
+        moving = set(self.moving_sprites)
+        sprites = [sprite for sprite in sprites if sprite in moving]
+        static_set = set(sprites)
+        self.moving_sprites = [sprite for sprite in self.moving_sprites if sprite not in static_set]
+
+        # A parità di y vale l'ordine della mappa (riga, poi colonna), qualunque sia l'ordine di caricamento dei chunk
+        self.static_sprites = sorted(self.static_sprites + sprites, key=lambda sprite: (sprite.rect.centery, sprite.rect.bottom, sprite.rect.x))
+        self.static_keys = [sprite.rect.centery for sprite in self.static_sprites]
+        self.static_margin = max((sprite.rect.height for sprite in self.static_sprites), default=0)
+
+    def add_static(self, sprites):
+        """Aggiunge al gruppo sprite che non si muovono (es. i tiles di un chunk)"""
+        self.add(sprites)
+        self.build_static_layer(sprites)
+
+    def remove_static(self, sprites):
+        """Toglie dal gruppo sprite del layer statico (es. un chunk scaricato)"""
+        removed = set()
+        for sprite in sprites:
+            if self.has(sprite):
+                # Salto remove_internal: il layer statico lo ricostruisco una volta sola
+                pygame.sprite.Group.remove_internal(self, sprite)
+                sprite.remove_internal(self)
+                removed.add(sprite)
+        self.static_sprites = [sprite for sprite in self.static_sprites if sprite not in removed]
+        self.static_keys = [sprite.rect.centery for sprite in self.static_sprites]
+
+    def _chunks_in_rect(self, rect):
+        """Restituisce le chiavi dei chunk di pavimento che toccano rect"""
+        rect = rect.clip(self.floor_rect)
+        if not rect.width or not rect.height:
+            return []
+        return [
+            (col, row)
+            for row in range(rect.top // CHUNK_SIZE, (rect.bottom - 1) // CHUNK_SIZE + 1)
+            for col in range(rect.left // CHUNK_SIZE, (rect.right - 1) // CHUNK_SIZE + 1)
+        ]
+
+    def visible_static_sprites(self):
+        """Restituisce i tiles statici che toccano la camera, gia' ordinati per y"""
+        start = bisect_left(self.static_keys, self.camera_rect.top - self.static_margin)
+        end = bisect_right(self.static_keys, self.camera_rect.bottom + self.static_margin)
+        camera_rect = self.camera_rect
+        return [sprite for sprite in self.static_sprites[start:end] if sprite.rect.colliderect(camera_rect)]
+
+    def interpolated_topleft(self, sprite, alpha):
+        """Posizione di disegno tra il tick precedente e quello attuale"""
+        previous = getattr(sprite, 'previous_topleft', None)
+        if previous is None or alpha >= 1.0:
+            return sprite.rect.topleft
+        return (
+            round(previous[0] + (sprite.rect.x - previous[0]) * alpha),
+            round(previous[1] + (sprite.rect.y - previous[1]) * alpha)
+        )
 
-        #create the floor
-        self.floor_surface = pygame.image.load("../map/floor_map.png").convert()
-        self.floor_rect = self.floor_surface.get_rect(topleft =(0,0))
+    def custom_draw(self, player, alpha=1.0):
 
-    def custom_draw(self, player):
+        # getting the offset (la camera segue la posizione interpolata del player)
+        player_x, player_y = self.interpolated_topleft(player, alpha)
+        self.offset.x = player_x + player.rect.width // 2 - self.half_width
+        self.offset.y = player_y + player.rect.height // 2 - self.half_heigth
+        self.camera_rect.topleft = (self.offset.x, self.offset.y)
 
-        # getting the offset
-        self.offset.x = player.rect.centerx - self.half_width
-        self.offset.y = player.rect.centery - self.half_heigth
+        # drawing the floor (solo i chunk sotto la camera)
+        for key in self._chunks_in_rect(self.camera_rect):
+            chunk_pos = (key[0] * CHUNK_SIZE - self.offset.x, key[1] * CHUNK_SIZE - self.offset.y)
+            floor = self.floor_chunks.get(key)
+            if floor is not None:
+                self.display_surface.blit(floor, chunk_pos)
 
-        # drawing the floor
-        floor_offset_pos = self.floor_rect.topleft - self.offset
-        self.display_surface.blit(self.floor_surface, floor_offset_pos)
+        for sprite in self.animated_sprites:
+            if sprite.rect.colliderect(self.camera_rect):
+                self.display_surface.blit(sprite.image, sprite.rect.topleft - self.offset)
 
-        for sprite in sorted(self.sprites(), key=lambda sprite: sprite.rect.centery):
-            offset_pos = sprite.rect.topleft - self.offset
+        # Riordino solo gli sprite in movimento visibili e li fondo col layer statico
+        moving = sorted(
+            (sprite for sprite in self.moving_sprites if sprite.rect.colliderect(self.camera_rect)),
+            key=lambda sprite: sprite.rect.centery
+        )
+        for sprite in merge(self.visible_static_sprites(), moving, key=lambda sprite: sprite.rect.centery):
+            offset_pos = self.interpolated_topleft(sprite, alpha) - self.offset
             self.display_surface.blit(sprite.image, offset_pos)
 
             # Disegna indicatore di interazione per NPC
             if hasattr(sprite, 'draw_interaction_indicator'):
-                sprite.draw_interaction_indicator(self.display_surface, self.offset)
\ No newline at end of file
+                sprite.draw_interaction_indicator(self.display_surface, self.offset)
@@ -1,7 +1,10 @@
-import pygame, sys
+import pygame, os, sys, time
 from settings import *
-from level import Level
+from map_manager import MapManager
 from time_manager import TimeManager
+from assets import asset_manager
+from debug import profiler
+from replay import InputRecorder
 
 
 class Game:
@@ -13,32 +16,97 @@ class Game:
         pygame.display.set_caption('M-Loop')
         self.clock = pygame.time.Clock()
         self.time_manager = TimeManager(time_speed=TIME_SPEED, start_time=START_TIME, end_time=END_TIME)
-        self.timer_font = pygame.font.Font(None, TIMER_FONT_SIZE)
-        self.level = Level(self.time_manager)
+        self.timer_font = asset_manager.font(None, TIMER_FONT_SIZE)
+
+        # Immagini lette dall'atlante delle texture prima di costruire la mappa
+        asset_manager.load_atlas(ASSET_PRELOAD_FOLDERS, progress=self.draw_loading)
+        self.map_manager = MapManager(self.time_manager)
+
+        # Tasti di ogni tick, per rifare la partita con replay.py
+        self.recorder = InputRecorder(self.level.map_name, self.time_manager) if RECORD_INPUT else None
+
+    def draw_loading(self, loaded, total):
+        """
+        Barra di caricamento (callback di asset_manager.load_atlas): prima le
+        immagini decodificate in parallelo se l'atlante va rifatto, poi i fogli
+        """
+        pygame.event.pump()
+        self.screen.fill('black')
+        bar = pygame.Rect(0, 0, WIDTH // 3, 12)
+        bar.center = (WIDTH // 2, HEIGTH // 2)
+        pygame.draw.rect(self.screen, TIMER_BORDER_COLOR, bar, 1)
+        if total:
+            filled = bar.inflate(-4, -4)
+            filled.width = filled.width * loaded // total
+            pygame.draw.rect(self.screen, TIMER_TEXT_COLOR, filled)
+        pygame.display.update()
+
+    def save_recording(self):
+        """Salva i tasti della partita in REPLAY_DIR (se RECORD_INPUT)"""
+        if self.recorder is None:
+            return
+        os.makedirs(REPLAY_DIR, exist_ok=True)
+        path = f"{REPLAY_DIR}/{time.strftime('%Y%m%d_%H%M%S')}.mlrec"
+        self.recorder.save(path)
+        print(f"Input registrato in {path} ({self.recorder.ticks} tick)")
+
+    @property
+    def level(self):
+        """Livello della mappa corrente"""
+        return self.map_manager.level
 
     def run(self):
-        while True:
-            delta_time = self.clock.get_time() / 1000.0
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    sys.exit()
-
-                # Gestione input per dialoghi
-                if event.type == pygame.KEYDOWN:
-                    # Se c'è un dialogo attivo, passa l'input al dialogue manager
-                    if self.level.dialogue_manager.active:
-                        self.level.dialogue_manager.handle_input(event)
-                    # Altrimenti gestisci interazioni con NPC
-                    elif event.key == pygame.K_e:
-                        self.level.handle_interaction()
-
-            self.time_manager.update(delta_time)
-            self.screen.fill('black')
-            self.level.run()
-            self.time_manager.draw(self.screen, self.timer_font)
-            pygame.display.update()
-            self.clock.tick(FPS)
+        # Simulazione a passo fisso: il rendering può saltare o aggiungere frame
+        accumulator = 0.0
+        previous_time = time.perf_counter()
+
+        # Anche se il gioco va in crash la registrazione viene salvata (serve a riprodurre il bug)
+        try:
+            while True:
+                profiler.begin_frame()
+                current_time = time.perf_counter()
+                frame_time = min(current_time - previous_time, MAX_FRAME_TIME)
+                previous_time = current_time
+                accumulator += frame_time
+
+                with profiler.scope('input'):
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT:
+                            sys.exit()
+
+                        # Gestione input per dialoghi
+                        if event.type == pygame.KEYDOWN:
+                            # Tasti del profiler
+                            if event.key == pygame.K_F3:
+                                profiler.toggle()
+                            elif event.key == pygame.K_F4:
+                                profiler.toggle_trace()
+                            # Dialogo attivo o interazione con gli NPC
+                            else:
+                                if self.recorder is not None:
+                                    self.recorder.record_keydown(event.key)
+                                self.level.handle_keydown(event)
+
+                # Tanti tick quanti ne stanno nel tempo reale accumulato
+                while accumulator >= TICK_TIME:
+                    if self.recorder is not None:
+                        self.recorder.record_tick(pygame.key.get_pressed())
+                    self.map_manager.update(TICK_TIME)
+                    accumulator -= TICK_TIME
+
+                self.screen.fill('black')
+                self.level.draw(accumulator / TICK_TIME)
+                with profiler.scope('hud'):
+                    self.time_manager.draw(self.screen, self.timer_font)
+                profiler.draw(self.screen)
+                pygame.display.update()
+                profiler.end_frame()
+                self.clock.tick(FPS)
+        finally:
+            profiler.stop_trace()
+            self.save_recording()
+            self.map_manager.shutdown()
+            pygame.quit()
 
 if __name__ == '__main__':
     game = Game()
@@ -0,0 +1,476 @@
+"""
+Compilatore delle mappe in un unico file binario.
+
+Impacchetta i layer CSV (come int16), i rect di collisione già uniti,
+gli spawn degli NPC, le porte verso altre mappe e le destinazioni con
+nome letti dal JSON di Tiled in un file .mlmap che il gioco apre con mmap, senza riparsare CSV e JSON
+a ogni avvio.
+
+Il pavimento (floor_map.png con i tiles calpestabili fermi già disegnati)
+viene diviso in un PNG per chunk, così il gioco carica solo i pezzi
+attorno al player.
+
+Il file compilato registra mtime e dimensione dei sorgenti e viene
+ricompilato automaticamente quando uno di essi cambia.
+
+Uso (dalla cartella code/):
+    python map_compiler.py [map_name]
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import numpy as np
+import pygame
+from settings import *
+from support import import_csv_layout, merge_collision_cells
+from tile_layer import TileLayer
+from schedule import parse_schedule
+
+MAGIC = b'MLMP'
+VERSION = 3
+
+# magic, versione, larghezza, altezza, n. layer, n. rect, byte stamp, byte oggetti (NPC + porte)
+HEADER = struct.Struct('<4sHHHHIII')
+LAYER_NAME_SIZE = 32
+
+# Layer CSV compilati (il nome del file è <layer>.csv)
+LAYER_NAMES = ('collision', 'walkable_objects', 'obstacle_objects')
+
+# Tiles calpestabili disegnati nei chunk del pavimento
+WALKABLE_GRAPHICS_DIR = '../graphics/walkable_objects'
+
+
+def map_directory(map_name):
+    """
+    Cartella dei file di una mappa: MAP_DIR/<map_name>/ se esiste,
+    altrimenti MAP_DIR solo per la mappa principale (MAP_DIR/<map_name>.json).
+
+    Raises:
+        FileNotFoundError: se la mappa non esiste (es. porta verso un nome sbagliato)
+    """
+    folder = f'{MAP_DIR}/{map_name}'
+    if os.path.isdir(folder):
+        return folder
+    if os.path.exists(f'{MAP_DIR}/{map_name}.json'):
+        return MAP_DIR
+    raise FileNotFoundError(f"Mappa '{map_name}' non trovata in {MAP_DIR}")
+
+
+def walkable_graphics_paths():
+    """Immagini dei tiles calpestabili nell'ordine degli id di Tiled (come import_folder)"""
+    paths = []
+    for folder, _, files in os.walk(WALKABLE_GRAPHICS_DIR):
+        paths.extend(f'{folder}/{file}' for file in sorted(files))
+    return paths
+
+
+def source_paths(map_dir, map_name):
+    """File sorgente di una mappa (CSV dei layer, JSON di Tiled, pavimento e tiles cotti nel pavimento)"""
+    paths = [f'{map_dir}/{layer}.csv' for layer in LAYER_NAMES]
+    paths.append(f'{map_dir}/{map_name}.json')
+    paths.append(f'{map_dir}/floor_map.png')
+    paths.extend(walkable_graphics_paths())
+    return paths
+
+
+def source_stamp(map_dir, map_name):
+    """mtime e dimensione dei sorgenti: se cambiano il file compilato è da rifare"""
+    stamp = {}
+    for path in source_paths(map_dir, map_name):
+        try:
+            stat = os.stat(path)
+            stamp[os.path.basename(path)] = [stat.st_mtime_ns, stat.st_size]
+        except FileNotFoundError:
+            stamp[os.path.basename(path)] = None
+    stamp['chunk_size'] = CHUNK_SIZE
+    return stamp
+
+
+def compiled_path(map_dir, map_name):
+    return f'{map_dir}/.cache/{map_name}.mlmap'
+
+
+def floor_chunk_path(map_dir, map_name, key):
+    """PNG del pavimento del chunk key = (col, row)"""
+    return f'{map_dir}/.cache/{map_name}_floor/{key[0]}_{key[1]}.png'
+
+
+def read_floor_chunk(map_dir, map_name, key):
+    """Decodifica il PNG del pavimento di un chunk (senza convert, va bene su un worker)"""
+    path = floor_chunk_path(map_dir, map_name, key)
+    if not os.path.exists(path):
+        return None
+    return pygame.image.load(path)
+
+
+def chunk_keys_around(center, radius, cols, rows):
+    """Chiavi dei chunk (dentro una mappa di cols x rows chunk) entro radius chunk da center, dal più vicino"""
+    col = int(center[0]) // CHUNK_SIZE
+    row = int(center[1]) // CHUNK_SIZE
+    keys = [
+        (key_col, key_row)
+        for key_row in range(max(0, row - radius), min(rows, row + radius + 1))
+        for key_col in range(max(0, col - radius), min(cols, col + radius + 1))
+    ]
+    keys.sort(key=lambda key: max(abs(key[0] - col), abs(key[1] - row)))
+    return keys
+
+
+def parse_npc_objects(map_data):
+    """
+    Legge gli spawn degli NPC dal layer 'npc' del JSON di Tiled.
+
+    Returns:
+        Lista di dict {'pos': (x, y), 'data': npc_data}
+    """
+    spawns = []
+
+    # Cerca il layer 'npc'
+    for layer in map_data['layers']:
+        if layer['type'] == 'objectgroup' and layer['name'] == 'npc':
+            for obj in layer['objects']:
+                npc_type = obj.get('class', obj.get('type', 'unknown')) # Tiled può usare 'class' o 'type' a seconda della versione
+
+                # Dati base NPC
+                npc_data = {
+                    'type': npc_type,
+                    'name': obj.get('name', f'NPC_{obj.get("id", 0)}'),
+                    'movement': 'static', #leggo il campo 'movement', se non esite uso static come default
+                    'dialogue_id': None,
+                    'waypoints': [],
+                    'speed': 2,
+                    'schedule': []
+                }
+
+                # Se in futuro aggiungi properties, le legge da qui
+                for prop in obj.get('properties', []):
+                    prop_name = prop['name']
+                    prop_value = prop['value']
+
+                    if prop_name == 'movement':
+                        npc_data['movement'] = prop_value
+                    elif prop_name == 'dialogue_id':
+                        npc_data['dialogue_id'] = prop_value
+                    elif prop_name == 'speed':
+                        npc_data['speed'] = int(prop_value)
+                    elif prop_name == 'waypoints':
+                        npc_data['waypoints'] = parse_waypoints(prop_value)
+                    elif prop_name == 'schedule':
+                        try:
+                            npc_data['schedule'] = parse_schedule(prop_value)
+                        except ValueError as error:
+                            # Un errore di battitura nella mappa non deve bloccare il gioco
+                            print(f"Warning: schedule di {npc_data['name']} ignorato ({error})")
+
+                spawns.append({'pos': (obj['x'], obj['y']), 'data': npc_data})
+
+            break  # Layer NPC trovato, esci dal loop
+
+    return spawns
+
+
+def parse_waypoints(value):
+    """
+    Legge i waypoints di un NPC dalla property di Tiled: "x,y; x,y; ..." in pixel.
+
+    Returns:
+        Lista di [x, y]
+    """
+    waypoints = []
+    for point in str(value).split(';'):
+        if point.strip():
+            x, y = point.split(',')
+            waypoints.append([float(x), float(y)])
+    return waypoints
+
+
+def parse_door_objects(map_data):
+    """
+    Legge le porte dal layer 'doors' del JSON di Tiled.
+
+    Ogni porta è un oggetto (rettangolo o punto) con le properties
+    target_map e, opzionali, target_x/target_y (posizione del player
+    nella mappa di arrivo).
+
+    Returns:
+        Lista di dict {'rect': [x, y, w, h], 'target_map': str, 'target_pos': [x, y] o None}
+    """
+    doors = []
+    for layer in map_data['layers']:
+        if layer['type'] == 'objectgroup' and layer['name'] == 'doors':
+            for obj in layer['objects']:
+                properties = {prop['name']: prop['value'] for prop in obj.get('properties', [])}
+                if 'target_map' not in properties:
+                    continue
+
+                # Gli oggetti punto diventano un tile
+                width = obj.get('width') or TILESIZE
+                height = obj.get('height') or TILESIZE
+                target_pos = None
+                if 'target_x' in properties and 'target_y' in properties:
+                    target_pos = [properties['target_x'], properties['target_y']]
+
+                doors.append({
+                    'rect': [int(obj['x']), int(obj['y']), int(width), int(height)],
+                    'target_map': properties['target_map'],
+                    'target_pos': target_pos
+                })
+            break
+
+    return doors
+
+
+def parse_destination_objects(map_data):
+    """
+    Legge le destinazioni con nome (mercato, chiesa, moli...) dal layer
+    'destinations' del JSON di Tiled: il punto è il centro dell'oggetto.
+
+    Returns:
+        Dict nome -> [x, y]
+    """
+    destinations = {}
+    for layer in map_data['layers']:
+        if layer['type'] == 'objectgroup' and layer['name'] == 'destinations':
+            for obj in layer['objects']:
+                if obj.get('name'):
+                    destinations[obj['name']] = [obj['x'] + obj.get('width', 0) / 2, obj['y'] + obj.get('height', 0) / 2]
+            break
+    return destinations
+
+
+def compile_map(map_dir, map_name, output_path=None):
+    """
+    Compila CSV + JSON di una mappa nel formato binario.
+
+    Returns:
+        Percorso del file scritto
+    """
+    output_path = output_path or compiled_path(map_dir, map_name)
+
+    layouts = {layer: import_csv_layout(f'{map_dir}/{layer}.csv') for layer in LAYER_NAMES}
+    height, width = layouts['collision'].shape
+
+    rects = merge_collision_cells(layouts['collision'], TILESIZE)
+    print(f"Collisioni {map_name}: {np.count_nonzero(layouts['collision'] != -1)} celle unite in {len(rects)} rect")
+
+    objects = {'npcs': [], 'doors': [], 'destinations': {}}
+    try:
+        with open(f'{map_dir}/{map_name}.json') as f:
+            map_data = json.load(f)
+        objects['npcs'] = parse_npc_objects(map_data)
+        objects['doors'] = parse_door_objects(map_data)
+        objects['destinations'] = parse_destination_objects(map_data)
+    except FileNotFoundError:
+        print(f"Warning: {map_name}.json non trovato, nessun NPC caricato")
+    except json.JSONDecodeError:
+        print(f"Errore: {map_name}.json non è un JSON valido")
+
+    stamp_bytes = json.dumps(source_stamp(map_dir, map_name)).encode('utf-8')
+    objects_bytes = json.dumps(objects).encode('utf-8')
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    temp_path = output_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, height, len(LAYER_NAMES), len(rects), len(stamp_bytes), len(objects_bytes)))
+        f.write(stamp_bytes)
+        _pad(f)
+
+        for name in LAYER_NAMES:
+            cells = layouts[name]
+            if cells.shape != (height, width):
+                raise ValueError(f"{name}.csv non ha la stessa dimensione di collision.csv")
+            f.write(name.encode('utf-8').ljust(LAYER_NAME_SIZE, b'\0'))
+            f.write(np.ascontiguousarray(cells, dtype='<i2').tobytes())
+            _pad(f)
+
+        f.write(np.array([tuple(rect) for rect in rects], dtype='<i4').tobytes())
+        f.write(objects_bytes)
+
+    compile_floor_chunks(map_dir, map_name, layouts['walkable_objects'])
+
+    # Sostituzione atomica: chi legge non vede mai un file a metà
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def compile_floor_chunks(map_dir, map_name, walkable_layout):
+    """
+    Divide floor_map.png in chunk di CHUNK_SIZE pixel e ci disegna sopra i
+    tiles calpestabili che non si animano (in ordine di y, come il gioco).
+
+    Returns:
+        Numero di chunk scritti (0 se la mappa non ha pavimento)
+    """
+    floor_path = f'{map_dir}/floor_map.png'
+    if not os.path.exists(floor_path):
+        return 0
+
+    floor = pygame.image.load(floor_path)
+    floor_rect = floor.get_rect()
+    chunks = {}
+    for chunk_y in range(0, floor_rect.height, CHUNK_SIZE):
+        for chunk_x in range(0, floor_rect.width, CHUNK_SIZE):
+            chunk_rect = pygame.Rect(chunk_x, chunk_y, CHUNK_SIZE, CHUNK_SIZE).clip(floor_rect)
+            # Surface senza alpha come il pavimento convertito per il display
+            surface = pygame.Surface(chunk_rect.size)
+            surface.blit(floor, (0, 0), chunk_rect)
+            chunks[(chunk_x // CHUNK_SIZE, chunk_y // CHUNK_SIZE)] = surface
+
+    graphics = [pygame.image.load(path) for path in walkable_graphics_paths()]
+    tiles = []
+    rows, cols = np.nonzero(walkable_layout != -1)
+    for row, col, tile_id in zip(rows.tolist(), cols.tolist(), walkable_layout[rows, cols].tolist()):
+        if tile_id not in ANIMATED_WALKABLE_IDS:
+            image = graphics[tile_id]
+            tiles.append((image, image.get_rect(bottomleft=(col * TILESIZE, row * TILESIZE + TILESIZE))))
+    tiles.sort(key=lambda tile: tile[1].centery)
+
+    for image, rect in tiles:
+        area = rect.clip(floor_rect)
+        if not area.width or not area.height:
+            continue
+        for row in range(area.top // CHUNK_SIZE, (area.bottom - 1) // CHUNK_SIZE + 1):
+            for col in range(area.left // CHUNK_SIZE, (area.right - 1) // CHUNK_SIZE + 1):
+                chunks[(col, row)].blit(image, (rect.x - col * CHUNK_SIZE, rect.y - row * CHUNK_SIZE))
+
+    folder = os.path.dirname(floor_chunk_path(map_dir, map_name, (0, 0)))
+    os.makedirs(folder, exist_ok=True)
+    for key, surface in chunks.items():
+        path = floor_chunk_path(map_dir, map_name, key)
+        temp_path = path[:-len('.png')] + '.tmp.png'
+        pygame.image.save(surface, temp_path)
+        os.replace(temp_path, path)
+    return len(chunks)
+
+
+def _pad(f, alignment=8):
+    """Allinea la posizione nel file per poter fare cast() delle sezioni"""
+    remainder = f.tell() % alignment
+    if remainder:
+        f.write(b'\0' * (alignment - remainder))
+
+
+def _align(offset, alignment=8):
+    return offset + (-offset % alignment)
+
+
+class CompiledMap:
+    """
+    Mappa compilata aperta con mmap.
+
+    I layer sono TileLayer con array NumPy int16 che puntano direttamente
+    al file, quindi il caricamento non dipende dalla dimensione della mappa.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.width, self.height, layer_count, rect_count, stamp_size, objects_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path}: formato mappa non supportato")
+
+        offset = HEADER.size
+        self.stamp = json.loads(self._mmap[offset:offset + stamp_size])
+        offset = _align(offset + stamp_size)
+
+        self.layers = {}
+        cell_count = self.width * self.height
+        for _ in range(layer_count):
+            name = self._mmap[offset:offset + LAYER_NAME_SIZE].rstrip(b'\0').decode('utf-8')
+            offset += LAYER_NAME_SIZE
+            cells = np.frombuffer(self._mmap, dtype='<i2', count=cell_count, offset=offset).reshape(self.height, self.width)
+            self.layers[name] = TileLayer(name, cells)
+            offset = _align(offset + cell_count * 2)
+
+        rect_values = np.frombuffer(self._mmap, dtype='<i4', count=rect_count * 4, offset=offset).reshape(rect_count, 4)
+        self.collision_rects = [tuple(int(value) for value in rect) for rect in rect_values]
+        offset += rect_count * 16
+
+        objects = json.loads(self._mmap[offset:offset + objects_size])
+        self.npc_spawns = objects['npcs']
+        self.doors = objects['doors']
+        self.destinations = objects.get('destinations', {})
+
+    def close(self):
+        self.layers = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Qualche array è ancora in uso: verrà chiuso col garbage collector
+            pass
+        self._file.close()
+
+
+def load_map(map_dir, map_name):
+    """
+    Apre la mappa compilata, ricompilandola se manca o se i sorgenti sono cambiati.
+
+    Returns:
+        CompiledMap
+    """
+    path = compiled_path(map_dir, map_name)
+    if os.path.exists(path):
+        try:
+            compiled = CompiledMap(path)
+            if compiled.stamp == source_stamp(map_dir, map_name):
+                return compiled
+            compiled.close()
+        except (ValueError, struct.error, OSError):
+            pass
+
+    compile_map(map_dir, map_name, path)
+    return CompiledMap(path)
+
+
+class LevelData:
+    """
+    Tutto ciò che serve per costruire un Level, caricato senza display.
+
+    Contiene solo lavoro sicuro da fare in un thread (lettura file, parsing,
+    eventuale compilazione, decodifica dei PNG): floors ha il pavimento già
+    decodificato dei chunk attorno ai punti di arrivo, il resto arriva a
+    chunk durante il gioco (ChunkManager). convert() e sprite restano al
+    Level sul thread principale.
+    """
+
+    def __init__(self, map_name, map_dir, compiled_map, floors=None):
+        self.map_name = map_name
+        self.map_dir = map_dir
+        self.map = compiled_map
+        self.floors = floors if floors is not None else {}  # (col, row) -> Surface non convertita
+
+
+def load_level_data(map_name, map_dir=None, arrivals=(), radius=CHUNK_LOAD_RADIUS):
+    """
+    Carica la mappa compilata (utilizzabile da un worker thread).
+
+    Args:
+        arrivals: Posizioni del player (topleft) da cui si può entrare nella
+                  mappa: il pavimento dei chunk attorno viene decodificato qui
+        radius: Chunk attorno a ogni arrivo (come CHUNK_LOAD_RADIUS)
+
+    Returns:
+        LevelData
+    """
+    map_dir = map_dir or map_directory(map_name)
+    compiled = load_map(map_dir, map_name)
+
+    floors = {}
+    cols = -(-compiled.width * TILESIZE // CHUNK_SIZE)
+    rows = -(-compiled.height * TILESIZE // CHUNK_SIZE)
+    for position in arrivals:
+        center = (position[0] + TILESIZE // 2, position[1] + TILESIZE // 2)
+        for key in chunk_keys_around(center, radius, cols, rows):
+            if key not in floors:
+                floors[key] = read_floor_chunk(map_dir, map_name, key)
+    return LevelData(map_name, map_dir, compiled, floors)
+
+
+if __name__ == '__main__':
+    name = sys.argv[1] if len(sys.argv) > 1 else 'npc_world'
+    print(f"Mappa compilata in {compile_map(MAP_DIR, name)}")
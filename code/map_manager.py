@@ -0,0 +1,136 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from settings import *
+from level import Level
+from map_compiler import load_level_data
+
+class MapManager:
+    """
+    Gestisce il Level corrente e il passaggio tra mappe collegate da porte.
+
+    Le mappe raggiungibili dal livello corrente vengono precaricate su
+    thread di lavoro (lettura file, parsing, compilazione); al passaggio
+    di una porta resta da fare solo la costruzione del Level e dei chunk
+    attorno al player sul thread principale. I livelli già visitati restano in
+    memoria (LRU) e tornarci è immediato.
+
+    A ogni nuovo loop del TimeManager il player torna allo spawn della
+    mappa iniziale (le altre mappe non hanno uno spawn proprio).
+    """
+
+    def __init__(self, time_manager, start_map='npc_world', workers=MAP_PRELOAD_WORKERS, cache_size=MAP_CACHE_SIZE, headless=False):
+        """
+        Args:
+            time_manager: TimeManager condiviso da tutti i livelli
+            start_map: Mappa iniziale
+            workers: Thread per il precaricamento
+            cache_size: Numero di Level costruiti tenuti in memoria
+            headless: Se True i livelli vengono costruiti senza display (simulazione, replay)
+        """
+        self.time_manager = time_manager
+        self.headless = headless
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='map_preload')
+        self.pending = {}            # map_name -> Future[LevelData]
+        self.levels = OrderedDict()  # map_name -> Level già costruito
+
+        self.start_map = start_map
+        self.loop_count = time_manager.loop_count
+        self.level = Level(time_manager, start_map, headless=headless)
+        self.levels[start_map] = self.level
+        # Porta su cui è arrivato il player: ignorata finché non ne esce
+        self.arrival_door = self.level.door_at(self.level.player.hitbox)
+        self.preload_linked_maps()
+
+    def preload_linked_maps(self):
+        """
+        Avvia il caricamento in background delle mappe collegate al livello
+        corrente, compreso il pavimento dei chunk dove arriva il player.
+        """
+        arrivals = {}
+        for door in self.level.doors:
+            position = door['target_pos'] if door['target_pos'] is not None else PLAYER_SPAWN
+            arrivals.setdefault(door['target_map'], []).append(tuple(position))
+
+        for map_name, positions in arrivals.items():
+            if map_name not in self.levels and map_name not in self.pending:
+                # In headless il pavimento non serve
+                positions = () if self.headless else list(dict.fromkeys(positions))
+                self.pending[map_name] = self.executor.submit(load_level_data, map_name, arrivals=positions)
+
+    def update(self, delta_time):
+        """Avanza il livello corrente di un tick e gestisce il passaggio delle porte"""
+        self.level.update(delta_time)
+
+        # Nuovo loop: si riparte dallo spawn della mappa iniziale, qualunque sia la mappa corrente
+        if self.loop_count != self.time_manager.loop_count:
+            self.loop_count = self.time_manager.loop_count
+            if self.level.map_name != self.start_map:
+                self.switch_to(self.start_map, PLAYER_SPAWN)
+                return
+
+        hitbox = self.level.player.hitbox
+        if self.arrival_door is not None and not self.arrival_door['rect'].colliderect(hitbox):
+            self.arrival_door = None
+
+        door = self.level.door_at(hitbox, ignore=self.arrival_door)
+        if door is not None and not self.level.dialogue_manager.active:
+            if not self.switch_to(door['target_map'], door['target_pos']):
+                # Porta verso una mappa che non c'è: non ci riprovo finché il player resta lì
+                self.arrival_door = door
+
+    def switch_to(self, map_name, player_pos=None):
+        """
+        Rende corrente un'altra mappa.
+
+        Args:
+            map_name: Mappa di destinazione
+            player_pos: Posizione del player (default: spawn della mappa)
+
+        Returns:
+            False se la mappa non esiste
+        """
+        level = self.levels.get(map_name)
+        if level is None:
+            future = self.pending.pop(map_name, None)
+            # Se il precaricamento non è finito (o non è partito) aspetto/carico qui
+            try:
+                level_data = future.result() if future is not None else load_level_data(map_name)
+            except FileNotFoundError as error:
+                print(f"Warning: {error}")
+                return False
+            spawn = tuple(player_pos) if player_pos is not None else PLAYER_SPAWN
+            level = Level(self.time_manager, map_name, headless=self.headless, level_data=level_data, player_pos=spawn)
+            self.levels[map_name] = level
+        self.levels.move_to_end(map_name)
+
+        # Un livello in cache può essere rimasto al loop precedente
+        level.sync_loop()
+
+        player = level.player
+        if player_pos is not None:
+            player.rect.topleft = tuple(player_pos)
+        else:
+            # Senza destinazione: se il player è su una porta (es. quella da cui era uscito) lo metto appena sotto
+            door = level.door_at(player.hitbox)
+            if door is not None:
+                player.hitbox.midtop = (door['rect'].centerx, door['rect'].bottom + 1)
+                player.rect.center = player.hitbox.center
+        player.hitbox.center = player.rect.center
+        player.previous_topleft = player.rect.topleft
+        level.chunks.update(player.hitbox.center, block=True)
+
+        self.level = level
+        # Se si arriva sopra una porta (es. quella di ritorno) non si riparte subito
+        self.arrival_door = level.door_at(player.hitbox)
+
+        while len(self.levels) > self.cache_size:
+            _, evicted = self.levels.popitem(last=False)
+            evicted.close()
+
+        self.preload_linked_maps()
+        return True
+
+    def shutdown(self):
+        """Ferma i thread di precaricamento"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,288 @@
+import heapq
+from collections import OrderedDict, deque
+import numpy as np
+import pygame
+from settings import *
+
+# Spostamenti su 4 vicini: niente tagli d'angolo tra due ostacoli
+NEIGHBOURS = ((0, 1), (0, -1), (1, 0), (-1, 0))
+UNREACHABLE = np.iinfo(np.int32).max
+
+
+class FlowField:
+    """
+    Distanza in celle di ogni cella libera da una destinazione.
+
+    È condiviso da tutti gli NPC diretti lì: il passo successivo è la
+    cella vicina più vicina alla meta, senza nessuna ricerca per NPC.
+    """
+
+    def __init__(self, goal, distances):
+        """
+        Args:
+            goal: Cella (riga, colonna) di destinazione
+            distances: Array int32 delle distanze (UNREACHABLE = non raggiungibile)
+        """
+        self.goal = goal
+        self.distances = distances
+        self.padded = np.pad(distances, 1, constant_values=UNREACHABLE)
+
+    def next_cells(self, rows, cols):
+        """
+        Cella successiva per ogni cella (vettorializzato).
+
+        Returns:
+            Tupla di array (righe, colonne); chi è già arrivato o non ha
+            strada resta dov'è
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        height, width = self.distances.shape
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        lookup_rows = np.clip(rows, 0, height - 1) + 1
+        lookup_cols = np.clip(cols, 0, width - 1) + 1
+
+        # Colonna 0 = restare fermi: vince solo se nessun vicino è più vicino alla meta
+        offsets = ((0, 0),) + NEIGHBOURS
+        candidates = np.stack([self.padded[lookup_rows + d_row, lookup_cols + d_col] for d_row, d_col in offsets])
+        best = np.argmin(candidates, axis=0)
+        best[~inside] = 0
+        d_rows = np.array([offset[0] for offset in offsets])[best]
+        d_cols = np.array([offset[1] for offset in offsets])[best]
+        return rows + d_rows, cols + d_cols
+
+
+class NavigationGrid:
+    """
+    Griglia di camminabilità della mappa con A*, flow field e cache dei percorsi.
+
+    Una cella è bloccata se sta nel layer di collisione o sotto la hitbox
+    di un tile ostacolo. I percorsi trovati restano in cache (LRU) e i
+    flow field delle destinazioni con nome (mercato, chiesa, moli...) sono
+    condivisi; quando gli ostacoli cambiano (set_blocked) la cache viene
+    invalidata.
+    """
+
+    def __init__(self, layers, obstacle_sizes=None, destinations=None, tile_size=TILESIZE, cache_size=NAV_PATH_CACHE_SIZE):
+        """
+        Args:
+            layers: Layer della mappa (TileLayer), servono 'collision' e 'obstacle_objects'
+            obstacle_sizes: Dimensioni (w, h) delle immagini ostacolo per id
+                            (None = blocca solo la cella di origine)
+            destinations: Dict nome -> punto [x, y] in pixel
+            tile_size: Lato di una cella in pixel
+            cache_size: Percorsi tenuti in cache
+        """
+        self.tile_size = tile_size
+        self.cache_size = cache_size
+        self.destinations = dict(destinations or {})
+
+        blocked = layers['collision'].mask()
+        obstacles = layers['obstacle_objects']
+        if obstacle_sizes is None:
+            blocked |= obstacles.mask()
+        else:
+            # Blocco le celle coperte dalla hitbox di ogni tile (come Tile: bottomleft sulla cella, 2px in meno sopra e sotto)
+            for row, col, tile_id in zip(*obstacles.nonempty()):
+                rect = pygame.Rect((0, 0), obstacle_sizes[tile_id])
+                rect.bottomleft = (col * tile_size, row * tile_size + tile_size)
+                col_start, row_start, col_end, row_end = obstacles.cell_bounds(rect.inflate(0, -4))
+                blocked[row_start:row_end, col_start:col_end] = True
+        self.walkable = ~blocked
+        self.height, self.width = self.walkable.shape
+
+        self.paths = OrderedDict()  # (start, goal) -> tupla di celle
+        self.flow_fields = {}       # cella goal -> FlowField
+
+    # --- Conversioni ---------------------------------------------------------
+
+    def cell_of(self, point):
+        """Cella (riga, colonna) che contiene un punto in pixel"""
+        return int(point[1] // self.tile_size), int(point[0] // self.tile_size)
+
+    def cell_center(self, cell):
+        """Centro in pixel di una cella (riga, colonna)"""
+        return ((cell[1] + 0.5) * self.tile_size, (cell[0] + 0.5) * self.tile_size)
+
+    def is_walkable(self, cell):
+        row, col = cell
+        return 0 <= row < self.height and 0 <= col < self.width and bool(self.walkable[row, col])
+
+    def walkable_points(self, points):
+        """True per i punti in pixel (array N x 2) su celle libere, vettorializzato"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        cols = (points[:, 0] // self.tile_size).astype(np.int64)
+        rows = (points[:, 1] // self.tile_size).astype(np.int64)
+        inside = (cols >= 0) & (cols < self.width) & (rows >= 0) & (rows < self.height)
+        free = inside.copy()
+        free[inside] = self.walkable[rows[inside], cols[inside]]
+        return free
+
+    # --- A* -------------------------------------------------------------------
+
+    def find_path(self, start, goal):
+        """
+        Percorso tra due punti in pixel.
+
+        Returns:
+            Lista di punti in pixel (centri delle celle dove il percorso
+            cambia direzione, meta compresa), [] se si è già nella cella
+            della meta, None se la meta non è raggiungibile
+        """
+        start_cell = self.cell_of(start)
+        goal_cell = self.cell_of(goal)
+        key = (start_cell, goal_cell)
+
+        cells = self.paths.get(key)
+        if cells is None and key not in self.paths:
+            cells = self.search(start_cell, goal_cell)
+            self.paths[key] = cells
+            while len(self.paths) > self.cache_size:
+                self.paths.popitem(last=False)
+        else:
+            self.paths.move_to_end(key)
+
+        if cells is None:
+            return None
+        return [self.cell_center(cell) for cell in self.turning_points(cells)]
+
+    def search(self, start, goal):
+        """
+        A* su 4 vicini con distanza di Manhattan.
+
+        Returns:
+            Tupla di celle da start (esclusa) a goal, oppure None
+        """
+        if not self.is_walkable(goal):
+            return None
+        if start == goal:
+            return ()
+
+        def heuristic(cell):
+            return abs(cell[0] - goal[0]) + abs(cell[1] - goal[1])
+
+        walkable = self.walkable
+        height, width = self.height, self.width
+        best = {start: 0}
+        came_from = {}
+        frontier = [(heuristic(start), 0, start)]
+        expanded = 0
+
+        while frontier:
+            _, cost, cell = heapq.heappop(frontier)
+            if cell == goal:
+                path = []
+                while cell != start:
+                    path.append(cell)
+                    cell = came_from[cell]
+                return tuple(reversed(path))
+            if cost > best[cell]:
+                continue
+
+            expanded += 1
+            if expanded > NAV_MAX_SEARCH_NODES:
+                return None
+
+            row, col = cell
+            for d_row, d_col in NEIGHBOURS:
+                next_row, next_col = row + d_row, col + d_col
+                if not (0 <= next_row < height and 0 <= next_col < width) or not walkable[next_row, next_col]:
+                    continue
+                next_cell = (next_row, next_col)
+                next_cost = cost + 1
+                if next_cost < best.get(next_cell, UNREACHABLE):
+                    best[next_cell] = next_cost
+                    came_from[next_cell] = cell
+                    heapq.heappush(frontier, (next_cost + heuristic(next_cell), next_cost, next_cell))
+        return None
+
+    @staticmethod
+    def turning_points(cells):
+        """Tiene solo le celle dove il percorso cambia direzione (e l'ultima)"""
+        points = []
+        for index, cell in enumerate(cells):
+            if index + 1 == len(cells):
+                points.append(cell)
+                break
+            following = cells[index + 1]
+            previous = cells[index - 1] if index else None
+            if previous is None or (cell[0] - previous[0], cell[1] - previous[1]) != (following[0] - cell[0], following[1] - cell[1]):
+                points.append(cell)
+        return points
+
+    # --- Flow field -----------------------------------------------------------
+
+    def flow_field(self, destination):
+        """
+        Flow field verso una destinazione (nome o punto in pixel), calcolato
+        la prima volta e poi condiviso.
+
+        Returns:
+            FlowField, oppure None se la destinazione non esiste o è bloccata
+        """
+        point = self.destinations.get(destination) if isinstance(destination, str) else destination
+        if point is None:
+            return None
+        goal = self.cell_of(point)
+        if not self.is_walkable(goal):
+            return None
+
+        field = self.flow_fields.get(goal)
+        if field is None:
+            field = self.flow_fields[goal] = FlowField(goal, self.distances_from(goal))
+        return field
+
+    def precompute_destinations(self):
+        """Calcola subito i flow field di tutte le destinazioni con nome"""
+        for name in self.destinations:
+            self.flow_field(name)
+
+    def distances_from(self, goal):
+        """Ricerca in ampiezza dalla meta: distanza in celle di ogni cella libera"""
+        distances = np.full(self.walkable.shape, UNREACHABLE, dtype=np.int32)
+        distances[goal] = 0
+        walkable = self.walkable
+        height, width = self.height, self.width
+        queue = deque([goal])
+        while queue:
+            row, col = queue.popleft()
+            next_distance = distances[row, col] + 1
+            for d_row, d_col in NEIGHBOURS:
+                next_row, next_col = row + d_row, col + d_col
+                if (0 <= next_row < height and 0 <= next_col < width and walkable[next_row, next_col]
+                        and distances[next_row, next_col] == UNREACHABLE):
+                    distances[next_row, next_col] = next_distance
+                    queue.append((next_row, next_col))
+        return distances
+
+    # --- Ostacoli che cambiano -------------------------------------------------
+
+    def set_blocked(self, rect, blocked=True):
+        """
+        Blocca o libera le celle coperte da rect (es. una porta che si chiude)
+        e invalida percorsi e flow field interessati. Gli NPC già in cammino
+        li aggiorna NPCMovementSystem.obstacles_changed(), che chiama questo.
+        """
+        rect = pygame.Rect(rect)
+        col_start = max(0, rect.left // self.tile_size)
+        row_start = max(0, rect.top // self.tile_size)
+        col_end = min(self.width, (rect.right - 1) // self.tile_size + 1)
+        row_end = min(self.height, (rect.bottom - 1) // self.tile_size + 1)
+        if col_start >= col_end or row_start >= row_end:
+            return
+        self.walkable[row_start:row_end, col_start:col_end] = not blocked
+
+        # I flow field coprono tutta la mappa: si ricalcolano alla prossima richiesta
+        self.flow_fields.clear()
+
+        if not blocked:
+            # Una cella libera in più può accorciare qualsiasi percorso
+            self.paths.clear()
+            return
+
+        # Cella bloccata: cadono solo i percorsi che ci passavano
+        def crosses(cells):
+            return cells is not None and any(row_start <= row < row_end and col_start <= col < col_end for row, col in cells)
+
+        for key in [key for key, cells in self.paths.items() if crosses(cells)]:
+            del self.paths[key]
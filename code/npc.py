@@ -1,5 +1,7 @@
 import pygame
 from settings import *
+from assets import asset_manager
+from text_cache import text_cache
 
 class NPC(pygame.sprite.Sprite):
     def __init__(self, pos, groups, npc_data):
@@ -8,9 +10,11 @@ class NPC(pygame.sprite.Sprite):
         - type: tipo di NPC (es: 'merchant', 'guard')
         - name: nome dell'NPC (opzionale)
         - movement: tipo di movimento ('static', 'patrol', 'wander')
-        - waypoints: lista di punti per patrol (opzionale)
+        - waypoints: lista di punti [x, y] per patrol (opzionale)
         - dialogue_id: ID del dialogo associato (opzionale)
-        - speed: velocità movimento (default: 2)
+        - speed: velocità movimento in pixel per tick (default: 2)
+        - schedule: routine della giornata, lista di dict {'time', 'location',
+          'activity', 'dialogue_id'} (opzionale, vedi schedule.parse_schedule)
         """
         super().__init__(groups)
         
@@ -19,28 +23,28 @@ class NPC(pygame.sprite.Sprite):
         self.name = npc_data.get('name', 'NPC')
         
         # Carica grafica
-        self.image = pygame.image.load(f'../graphics/npc/{self.npc_type}.png').convert_alpha()
+        self.image = asset_manager.image(f'../graphics/npc/{self.npc_type}.png')
         self.rect = self.image.get_rect(topleft=pos)
         self.hitbox = self.rect.inflate(-10, -20)
+        self.previous_topleft = self.rect.topleft  # Posizione al tick precedente (interpolazione)
         
-        # Sistema di movimento (per future fasi)
+        # Movimento: lo esegue NPCMovementSystem per tutti gli NPC insieme
         self.movement_type = npc_data.get('movement', 'static')
         self.speed = npc_data.get('speed', 2)
-        self.direction = pygame.math.Vector2()
         
         # Waypoints per pattugliamento (se presenti)
         self.waypoints = npc_data.get('waypoints', [])
-        self.current_waypoint = 0
         
         # Dialoghi
         self.dialogue_id = npc_data.get('dialogue_id', None)
         self.can_interact = False # Viene impostato dal player quando è nel raggio
         
-        # Schedule (orari - per future fasi)
-        self.schedule = npc_data.get('schedule', None)
+        # Routine: gli eventi li applica il Level quando il TimeManager li estrae dallo schedule
+        self.schedule = npc_data.get('schedule') or []
+        self.activity = None  # Attività corrente secondo la routine
 
         # Indicator grafico
-        self.indicator_font = pygame.font.Font(None, 24)
+        self.indicator_font = asset_manager.font(None, 24)
         
     def draw_interaction_indicator(self, surface, offset):
         """Disegna l'indicatore 'E' sopra l'NPC quando il player può interagire"""
@@ -56,24 +60,10 @@ class NPC(pygame.sprite.Sprite):
             pygame.draw.circle(surface, (255, 255, 255), indicator_pos, 12, 2)
             
             # Disegna la lettera 'E'
-            text = self.indicator_font.render('E', True, (255, 255, 100))
+            text = text_cache.render(self.indicator_font, 'E', (255, 255, 100))
             text_rect = text.get_rect(center=indicator_pos)
             surface.blit(text, text_rect)
         
-    def move(self):
-        """Gestisce il movimento dell'NPC (da implementare in Fase 6)"""
-        if self.movement_type == 'static':
-            return  # NPC fermo
-        
-        elif self.movement_type == 'patrol':
-            # TODO: Implementare logica di pattugliamento
-            pass
-        
-        elif self.movement_type == 'wander':
-            # TODO: Implementare movimento casuale
-            pass
-    
     def update(self):
-        """Chiamato ogni frame"""
-        # Per ora non fa nulla, ma è pronto per movimento futuro
-        self.move()
\ No newline at end of file
+        """Chiamato ogni tick di simulazione (il movimento è in NPCMovementSystem)"""
+        self.previous_topleft = self.rect.topleft
\ No newline at end of file
@@ -0,0 +1,343 @@
+import numpy as np
+import pygame
+from settings import *
+
+# Tipi di movimento (campo 'movement' degli NPC)
+STATIC = 0
+PATROL = 1
+WANDER = 2
+GOTO = 3  # Verso una destinazione condivisa (flow field), poi fermo
+MOVEMENT_TYPES = {'static': STATIC, 'patrol': PATROL, 'wander': WANDER}
+
+
+class NPCMovementSystem:
+    """
+    Muove tutti gli NPC insieme, un passo vettorializzato per tick.
+
+    Posizioni, velocità, velocità massime, waypoint e obiettivi stanno in
+    array NumPy (una riga per NPC). Ogni tick gli NPC in movimento avanzano
+    verso il loro obiettivo; rect e hitbox (e le griglie) vengono
+    aggiornati solo per gli NPC che hanno cambiato pixel.
+
+    - patrol: percorre i waypoints in ciclo
+    - wander: sceglie punti a caso entro NPC_WANDER_RADIUS dalla posizione
+      iniziale, su celle libere, con una pausa tra uno e l'altro
+    - send_to(): porta gli NPC a una destinazione condivisa con un flow field
+
+    Con una NavigationGrid gli spostamenti tra un waypoint e l'altro
+    seguono il percorso A* (in cache) invece della linea retta.
+    """
+
+    def __init__(self, npcs, navigation=None, obstacle_grid=None, npc_grid=None, seed=NPC_RANDOM_SEED):
+        """
+        Args:
+            npcs: NPC da muovere
+            navigation: NavigationGrid della mappa (None = linea retta, nessun controllo)
+            obstacle_grid: Griglia delle collisioni da aggiornare (hitbox)
+            npc_grid: Griglia degli NPC da aggiornare (rect)
+            seed: Seme del generatore casuale (wander riproducibile)
+        """
+        self.npcs = list(npcs)
+        self.index_of = {id(npc): index for index, npc in enumerate(self.npcs)}
+        self.navigation = navigation
+        self.obstacle_grid = obstacle_grid
+        self.npc_grid = npc_grid
+        self.rng = np.random.default_rng(seed)
+        count = len(self.npcs)
+
+        self.positions = np.array([npc.rect.topleft for npc in self.npcs], dtype=np.float64).reshape(count, 2)
+        self.drawn = self.positions.astype(np.int64)  # Posizione intera attuale dei rect
+        self.home = self.positions.copy()
+        self.velocities = np.zeros((count, 2))
+        self.speeds = np.array([npc.speed for npc in self.npcs], dtype=np.float64)
+        self.half_sizes = np.array([npc.rect.size for npc in self.npcs], dtype=np.float64).reshape(count, 2) / 2
+        self.modes = np.array([MOVEMENT_TYPES.get(npc.movement_type, STATIC) for npc in self.npcs], dtype=np.int8)
+        self.wait = np.zeros(count, dtype=np.int32)  # Tick di pausa rimasti
+
+        # Waypoints in un array (NPC x waypoint x 2), righe corte riempite con l'ultimo punto
+        counts = [len(npc.waypoints) for npc in self.npcs]
+        self.waypoint_counts = np.array(counts, dtype=np.int64)
+        self.waypoints = np.zeros((count, max(counts, default=0) or 1, 2))
+        for index, npc in enumerate(self.npcs):
+            if npc.waypoints:
+                points = np.asarray(npc.waypoints, dtype=np.float64)
+                self.waypoints[index, :len(points)] = points
+                self.waypoints[index, len(points):] = points[-1]
+        self.waypoint_index = np.zeros(count, dtype=np.int64)
+
+        # Un patrol senza waypoints resta fermo
+        self.modes[(self.modes == PATROL) & (self.waypoint_counts == 0)] = STATIC
+
+        # Obiettivo del tick corrente e resto del percorso (liste di punti, topleft in pixel)
+        self.targets = self.positions.copy()
+        self.routes = [[] for _ in range(count)]
+        self.fields = [None] * count  # FlowField degli NPC in GOTO
+
+        for index in np.flatnonzero(self.modes == PATROL).tolist():
+            self.route_to(index, self.waypoints[index, 0])
+
+        self.active = np.flatnonzero(self.modes != STATIC)
+
+    def update(self):
+        """Avanza di un tick tutti gli NPC in movimento"""
+        self.velocities[:] = 0
+        indices = self.active
+        if not indices.size:
+            return
+
+        # Chi è in pausa conta solo i tick
+        waiting = self.wait[indices] > 0
+        self.wait[indices[waiting]] -= 1
+        indices = indices[~waiting]
+        if not indices.size:
+            return
+
+        delta = self.targets[indices] - self.positions[indices]
+        distances = np.hypot(delta[:, 0], delta[:, 1])
+        speeds = self.speeds[indices]
+        arrived = distances <= speeds
+
+        steps = delta * np.where(arrived, 1.0, speeds / np.maximum(distances, 1e-9))[:, None]
+        self.velocities[indices] = steps
+        self.positions[indices] += steps
+
+        self.next_targets(indices[arrived])
+        self.write_back(indices)
+
+    def next_targets(self, indices):
+        """Nuovo obiettivo per gli NPC arrivati"""
+        if not indices.size:
+            return
+
+        # Chi ha ancora punti del percorso passa al successivo
+        on_route = np.array([bool(self.routes[index]) for index in indices.tolist()], dtype=bool)
+        for index in indices[on_route].tolist():
+            self.targets[index] = self.routes[index].pop(0)
+        indices = indices[~on_route]
+
+        patrol = indices[self.modes[indices] == PATROL]
+        if patrol.size:
+            self.waypoint_index[patrol] = (self.waypoint_index[patrol] + 1) % self.waypoint_counts[patrol]
+            for index, waypoint in zip(patrol.tolist(), self.waypoints[patrol, self.waypoint_index[patrol]]):
+                self.route_to(index, waypoint)
+
+        wander = indices[self.modes[indices] == WANDER]
+        if wander.size:
+            candidates = np.rint(self.home[wander] + self.rng.uniform(-NPC_WANDER_RADIUS, NPC_WANDER_RADIUS, (wander.size, 2)))
+            free = self.free_points(candidates + self.half_sizes[wander])
+            # Punto occupato: resto dove sono e riprovo dopo la pausa
+            for index, candidate in zip(wander[free].tolist(), candidates[free]):
+                self.route_to(index, candidate)
+            self.targets[wander[~free]] = self.positions[wander[~free]]
+            self.wait[wander] = self.rng.integers(NPC_WANDER_PAUSE[0], NPC_WANDER_PAUSE[1] + 1, wander.size)
+
+        goto = indices[self.modes[indices] == GOTO]
+        if goto.size:
+            self.follow_fields(goto)
+
+    def follow_fields(self, indices):
+        """Passo successivo lungo il flow field, per tutti gli NPC che condividono la stessa destinazione"""
+        navigation = self.navigation
+        fields = {}
+        for index in indices.tolist():
+            fields.setdefault(id(self.fields[index]), []).append(index)
+
+        for group in fields.values():
+            group = np.array(group)
+            field = self.fields[group[0]]
+            centers = self.positions[group] + self.half_sizes[group]
+            rows = (centers[:, 1] // navigation.tile_size).astype(np.int64)
+            cols = (centers[:, 0] // navigation.tile_size).astype(np.int64)
+            next_rows, next_cols = field.next_cells(rows, cols)
+
+            # Nessun passo possibile: arrivati alla meta (o senza strada), ci si ferma
+            stopped = (next_rows == rows) & (next_cols == cols)
+            self.modes[group[stopped]] = STATIC
+            for index in group[stopped].tolist():
+                self.fields[index] = None
+
+            moving = ~stopped
+            next_centers = np.column_stack(((next_cols[moving] + 0.5) * navigation.tile_size, (next_rows[moving] + 0.5) * navigation.tile_size))
+            self.targets[group[moving]] = next_centers - self.half_sizes[group[moving]]
+
+        self.active = np.flatnonzero(self.modes != STATIC)
+
+    def route_to(self, index, goal):
+        """
+        Imposta il percorso di un NPC fino a goal (topleft in pixel).
+
+        Returns:
+            False se la meta non è raggiungibile (o A* ha superato
+            NAV_MAX_SEARCH_NODES): l'NPC resta fermo, fa una pausa e poi
+            passa al prossimo obiettivo
+        """
+        goal = np.asarray(goal, dtype=np.float64)
+        path = []
+        if self.navigation is not None:
+            half = self.half_sizes[index]
+            path = self.navigation.find_path(self.positions[index] + half, goal + half)
+
+        if path is None:
+            self.hold(index)
+            return False
+
+        if path:
+            # I punti del percorso sono centri di cella: l'ultimo diventa il punto esatto
+            points = [np.subtract(point, self.half_sizes[index]) for point in path[:-1]]
+            points.append(goal)
+        else:
+            # Già nella cella della meta (o senza navigazione): linea retta
+            points = [goal]
+        self.targets[index] = points[0]
+        self.routes[index] = points[1:]
+        return True
+
+    def hold(self, index):
+        """Ferma un NPC dov'è: dopo la pausa sceglie il prossimo obiettivo"""
+        self.targets[index] = self.positions[index]
+        self.routes[index] = []
+        self.wait[index] = NPC_WANDER_PAUSE[1]
+
+    def send_to(self, npcs, destination):
+        """
+        Manda gli NPC verso una destinazione: tutti seguono lo stesso flow
+        field, quindi il costo è una sola ricerca qualunque sia il numero di NPC.
+
+        Args:
+            npcs: NPC da spostare
+            destination: Nome di una destinazione della mappa o punto [x, y] in pixel
+
+        Returns:
+            False se la destinazione non esiste o non è raggiungibile
+        """
+        field = self.navigation.flow_field(destination) if self.navigation is not None else None
+        if field is None:
+            return False
+
+        indices = np.array([self.index_of[id(npc)] for npc in npcs], dtype=np.int64)
+        self.modes[indices] = GOTO
+        self.wait[indices] = 0
+        for index in indices.tolist():
+            self.fields[index] = field
+            self.routes[index] = []
+        # Obiettivo = posizione attuale: il primo passo lo sceglie il flow field
+        self.targets[indices] = self.positions[indices]
+        self.active = np.flatnonzero(self.modes != STATIC)
+        return True
+
+    # Campi array dello stato (snapshot/restore)
+    STATE_ARRAYS = ('positions', 'drawn', 'home', 'velocities', 'modes', 'wait', 'waypoint_index', 'targets')
+
+    def get_state(self):
+        """Copia dello stato di tutti gli NPC (per WorldSnapshot)"""
+        state = {name: getattr(self, name).copy() for name in self.STATE_ARRAYS}
+        state['routes'] = [list(route) for route in self.routes]
+        state['fields'] = list(self.fields)
+        state['rng'] = self.rng.bit_generator.state
+        return state
+
+    def set_state(self, state):
+        """
+        Ripristina uno stato di get_state(), riscrivendo solo ciò che è cambiato.
+
+        Returns:
+            Numero di NPC spostati
+        """
+        old_drawn = self.drawn.copy()
+        for name in self.STATE_ARRAYS:
+            current = getattr(self, name)
+            if not np.array_equal(current, state[name]):
+                np.copyto(current, state[name])
+
+        self.routes = [list(route) for route in state['routes']]
+        self.fields[:] = state['fields']
+        self.rng.bit_generator.state = state['rng']
+        self.active = np.flatnonzero(self.modes != STATIC)
+
+        # Rect e griglie solo per gli NPC che non sono dove erano
+        moved = np.flatnonzero(np.any(old_drawn != self.drawn, axis=1))
+        for index in moved.tolist():
+            npc = self.npcs[index]
+            npc.rect.topleft = self.drawn[index].tolist()
+            npc.hitbox.center = npc.rect.center
+            npc.previous_topleft = npc.rect.topleft  # Niente interpolazione sul teletrasporto
+            if self.obstacle_grid is not None:
+                self.obstacle_grid.move(npc.hitbox)
+            if self.npc_grid is not None:
+                self.npc_grid.move(npc.rect)
+        return moved.size
+
+    def obstacles_changed(self, rect, blocked=True):
+        """
+        Blocca o libera un'area della mappa (es. una porta che si chiude) e
+        aggiorna gli NPC in movimento: chi ha ancora davanti un percorso che
+        attraversa l'area lo ricalcola, chi segue un flow field prende quello
+        nuovo (o si ferma se la meta non è più raggiungibile).
+
+        Args:
+            rect: Area in pixel
+            blocked: True per bloccarla, False per liberarla
+        """
+        if self.navigation is None:
+            return
+        rect = pygame.Rect(rect)
+        self.navigation.set_blocked(rect, blocked)
+
+        # Flow field: la navigazione li ha buttati, un solo ricalcolo per meta
+        fields = {}
+        for index, field in enumerate(self.fields):
+            if field is None:
+                continue
+            if field.goal not in fields:
+                fields[field.goal] = self.navigation.flow_field(self.navigation.cell_center(field.goal))
+            self.fields[index] = fields[field.goal]
+            if self.fields[index] is None:
+                self.modes[index] = STATIC
+            # Il passo in corso era scelto col vecchio field: il prossimo lo sceglie quello nuovo
+            self.targets[index] = self.positions[index]
+
+        # Percorsi A*: solo chi passa dall'area appena bloccata
+        if blocked:
+            for index in self.active.tolist():
+                if self.modes[index] != GOTO and self.route_crosses(index, rect):
+                    points = self.routes[index]
+                    if self.route_to(index, points[-1] if points else self.targets[index].copy()) and self.route_crosses(index, rect):
+                        # Meta dentro l'area bloccata: fermo qui, dopo la pausa il prossimo obiettivo
+                        self.hold(index)
+
+        self.active = np.flatnonzero(self.modes != STATIC)
+
+    def route_crosses(self, index, rect):
+        """True se il resto del percorso di un NPC (hitbox del centro) tocca rect"""
+        half = self.half_sizes[index]
+        points = [self.positions[index], self.targets[index], *self.routes[index]]
+        centers = [(float(point[0] + half[0]), float(point[1] + half[1])) for point in points]
+        for (x1, y1), (x2, y2) in zip(centers, centers[1:]):
+            segment = pygame.Rect(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+            if segment.colliderect(rect):
+                return True
+        return False
+
+    def free_points(self, points):
+        """True per i punti (in pixel) che cadono su una cella libera della mappa"""
+        if self.navigation is None:
+            return np.ones(len(points), dtype=bool)
+        return self.navigation.walkable_points(points)
+
+    def write_back(self, indices):
+        """Copia la posizione su rect e hitbox solo per gli NPC che hanno cambiato pixel"""
+        rounded = np.rint(self.positions[indices]).astype(np.int64)
+        changed = np.any(rounded != self.drawn[indices], axis=1)
+        moved = indices[changed]
+        if not moved.size:
+            return
+        self.drawn[moved] = rounded[changed]
+
+        for index, position in zip(moved.tolist(), rounded[changed].tolist()):
+            npc = self.npcs[index]
+            npc.rect.topleft = position
+            npc.hitbox.center = npc.rect.center
+            if self.obstacle_grid is not None:
+                self.obstacle_grid.move(npc.hitbox)
+            if self.npc_grid is not None:
+                self.npc_grid.move(npc.rect)
@@ -1,26 +1,32 @@
 import pygame
 from settings import *
 from support import import_folder
+from assets import asset_manager
+from debug import profiler
 
 class Player(pygame.sprite.Sprite ):
-    def __init__(self, pos, groups, obstacle_sprites):
+    def __init__(self, pos, groups, obstacle_grid):
         super().__init__(groups)
-        self.image = pygame.image.load('../graphics/player/down/0.png').convert_alpha()
+        self.image = asset_manager.image('../graphics/player/down/0.png')
         self.rect = self.image.get_rect(topleft=pos)
         self.hitbox = self.rect.inflate(0, -4)
+        self.previous_topleft = self.rect.topleft  # Posizione al tick precedente (interpolazione)
 
         # graphics setup
         self.import_player_assets()
         self.status = 'down'
         self.frame_index = 0
-        self.animation_speed = 0.15
+        self.animation_speed = 0.15  # Frame di animazione per tick
 
         # movement
         self.direction = pygame.math.Vector2()
-        self.speed = 5
+        self.speed = 5  # Pixel per tick (TICK_RATE)
         self.can_move = True  # Flag per bloccare movimento durante dialoghi
 
-        self.obstacle_sprites = obstacle_sprites
+        # Se impostato sostituisce pygame.key.get_pressed() (simulazione headless, replay)
+        self.key_state = None
+
+        self.obstacle_grid = obstacle_grid  # SpatialGrid con le hitbox degli ostacoli
 
         # Interaction system
         self.interaction_radius = 50  # Raggio in pixel per interagire
@@ -44,7 +50,7 @@ class Player(pygame.sprite.Sprite ):
             self.animations[idle_key] = [self.animations[direction][0]]
 
     def input(self):
-        keys = pygame.key.get_pressed()
+        keys = self.key_state if self.key_state is not None else pygame.key.get_pressed()
 
         # Se non può muoversi (es: durante dialogo), non accettare input movimento
         if not self.can_move:
@@ -71,27 +77,37 @@ class Player(pygame.sprite.Sprite ):
         else:
             self.direction.x = 0
 
-    def check_nearby_npcs(self, npc_sprites):
+    def check_nearby_npcs(self, npc_grid, npc_lookup):
         """
         Controlla se ci sono NPC nel raggio di interazione.
         Trova l'NPC più vicino.
+
+        Args:
+            npc_grid: SpatialGrid con i rect degli NPC
+            npc_lookup: Dict id(npc.rect) -> NPC
         """
-        self.nearby_npc = None
-        min_distance = self.interaction_radius
-        
-        for npc in npc_sprites:
-            distance = pygame.math.Vector2(
-                npc.rect.centerx - self.rect.centerx,
-                npc.rect.centery - self.rect.centery
-            ).length()
-            
+        radius = self.interaction_radius
+        center_x, center_y = self.rect.center
+        area = pygame.Rect(center_x - radius, center_y - radius, radius * 2, radius * 2)
+
+        # Solo gli NPC nelle celle attorno al player, distanze al quadrato (niente radice)
+        nearest = None
+        min_distance = radius * radius
+        for rect in npc_grid.query(area):
+            distance_x = rect.centerx - center_x
+            distance_y = rect.centery - center_y
+            distance = distance_x * distance_x + distance_y * distance_y
             if distance < min_distance:
                 min_distance = distance
-                self.nearby_npc = npc
-        
-        # Imposta flag can_interact sull'NPC
-        for npc in npc_sprites:
-            npc.can_interact = (npc == self.nearby_npc)
+                nearest = npc_lookup[id(rect)]
+
+        # Aggiorno can_interact solo sugli NPC che cambiano stato
+        if nearest is not self.nearby_npc:
+            if self.nearby_npc is not None:
+                self.nearby_npc.can_interact = False
+            if nearest is not None:
+                nearest.can_interact = True
+            self.nearby_npc = nearest
 
     def get_status(self):
 
@@ -105,28 +121,32 @@ class Player(pygame.sprite.Sprite ):
         if self.direction.magnitude() != 0:
             self.direction = self.direction.normalize() # mi serve per evitare che combinando diversi vettori di movimento (es se muovo in obliquo) la velocità aumenti
         
-        self.hitbox.x +=  self.direction.x * speed
-        self.collision('horizontal')
-        self.hitbox.y +=  self.direction.y * speed
-        self.collision('vertical')
+        with profiler.scope('collision'):
+            self.hitbox.x +=  self.direction.x * speed
+            self.collision('horizontal')
+            self.hitbox.y +=  self.direction.y * speed
+            self.collision('vertical')
         self.rect.center = self.hitbox.center
 
     def collision(self, direction):
+        # Controllo solo gli ostacoli nelle celle toccate dalla hitbox
+        obstacles = self.obstacle_grid.query(self.hitbox)
+
         if direction == 'horizontal':
-            for sprite in self.obstacle_sprites:
-                if sprite.hitbox.colliderect(self.hitbox):
+            for hitbox in obstacles:
+                if hitbox.colliderect(self.hitbox):
                     if self.direction.x > 0: # moving right
-                        self.hitbox.right = sprite.hitbox.left
+                        self.hitbox.right = hitbox.left
                     elif self.direction.x < 0: # moving left
-                        self.hitbox.left = sprite.hitbox.right
+                        self.hitbox.left = hitbox.right
                     
         if direction == 'vertical':
-            for sprite in self.obstacle_sprites:
-                if sprite.hitbox.colliderect(self.hitbox):
+            for hitbox in obstacles:
+                if hitbox.colliderect(self.hitbox):
                     if self.direction.y > 0: # moving down
-                        self.hitbox.bottom= sprite.hitbox.top
+                        self.hitbox.bottom= hitbox.top
                     elif self.direction.y < 0: # moving up
-                        self.hitbox.top = sprite.hitbox.bottom
+                        self.hitbox.top = hitbox.bottom
 
     def animate(self):
         animation = self.animations[self.status]
@@ -141,8 +161,10 @@ class Player(pygame.sprite.Sprite ):
         self.rect = self.image.get_rect(center = self.hitbox.center)
 
     def update(self):
-        self.input()
-        self.get_status()
-        self.animate()
-        self.move(self.speed)
+        with profiler.scope('player'):
+            self.previous_topleft = self.rect.topleft
+            self.input()
+            self.get_status()
+            self.animate()
+            self.move(self.speed)
 
@@ -0,0 +1,182 @@
+"""
+Registrazione e replay deterministico dell'input.
+
+Il gioco avanza a tick fissi, quindi per rifare una partita bastano i
+tasti: per ogni tick lo stato dei tasti di movimento letto da
+Player.input (una bitmask, salvata a run-length) e i KEYDOWN passati a
+Level.handle_keydown con l'indice del tick. Il replay gira su
+HeadlessSimulation, senza display e alla massima velocità.
+
+Formato .mlrec (little endian):
+    header   magic, versione, TICK_RATE, tick totali, n. run, n. eventi,
+             time_speed, start_time, end_time, lunghezza del nome mappa
+    mappa    nome della mappa iniziale (utf-8)
+    run      (bitmask, numero di tick) per ogni tratto con gli stessi tasti
+    eventi   (tick, tasto) per ogni KEYDOWN
+
+Uso (dalla cartella code/):
+    python replay.py ../replays/20250101_120000.mlrec
+"""
+import struct
+import pygame
+from settings import *
+from headless import HeadlessSimulation, KeyState
+
+MAGIC = b'MLRC'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHHIIIdddH')
+RUN = struct.Struct('<BI')
+EVENT = struct.Struct('<II')
+
+# Tasti letti da Player.input, un bit ciascuno
+RECORDED_KEYS = (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT)
+
+
+def key_mask(pressed):
+    """Bitmask dei RECORDED_KEYS premuti (pressed come pygame.key.get_pressed())"""
+    mask = 0
+    for bit, key in enumerate(RECORDED_KEYS):
+        if pressed[key]:
+            mask |= 1 << bit
+    return mask
+
+
+def mask_keys(mask):
+    """Tasti (costanti pygame.K_*) di una bitmask"""
+    return [key for bit, key in enumerate(RECORDED_KEYS) if mask & (1 << bit)]
+
+
+class InputRecorder:
+    """
+    Registra l'input di una partita tick per tick.
+
+    Game.run chiama record_keydown() per ogni KEYDOWN passato al livello
+    e record_tick() prima di ogni tick di simulazione.
+    """
+
+    def __init__(self, map_name, time_manager):
+        """
+        Args:
+            map_name: Mappa iniziale della partita
+            time_manager: TimeManager della partita (parametri del tempo)
+        """
+        self.map_name = map_name
+        self.time_speed = time_manager.time_speed
+        self.start_time = time_manager.start_time
+        self.end_time = time_manager.end_time
+        self.ticks = 0
+        self.runs = []    # [bitmask, numero di tick]
+        self.events = []  # (tick, tasto)
+
+    def record_keydown(self, key):
+        """KEYDOWN da applicare prima del prossimo tick"""
+        self.events.append((self.ticks, key))
+
+    def record_tick(self, pressed):
+        """Stato dei tasti usato dal tick che sta per essere simulato"""
+        mask = key_mask(pressed)
+        if self.runs and self.runs[-1][0] == mask:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([mask, 1])
+        self.ticks += 1
+
+    def save(self, path):
+        """Scrive la registrazione su file (.mlrec)"""
+        name = self.map_name.encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, TICK_RATE, self.ticks, len(self.runs), len(self.events),
+                                self.time_speed, self.start_time, self.end_time, len(name)))
+            f.write(name)
+            for mask, length in self.runs:
+                f.write(RUN.pack(mask, length))
+            for tick, key in self.events:
+                f.write(EVENT.pack(tick, key))
+
+
+class InputLog:
+    """Registrazione letta da file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        (magic, version, tick_rate, self.ticks, run_count, event_count,
+         self.time_speed, self.start_time, self.end_time, name_size) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: formato della registrazione non supportato")
+        if tick_rate != TICK_RATE:
+            raise ValueError(f"{path}: registrata a {tick_rate} tick/s, il gioco ne usa {TICK_RATE}")
+
+        offset = HEADER.size
+        self.map_name = data[offset:offset + name_size].decode('utf-8')
+        offset += name_size
+        self.runs = list(RUN.iter_unpack(data[offset:offset + run_count * RUN.size]))
+        offset += run_count * RUN.size
+        self.events = list(EVENT.iter_unpack(data[offset:offset + event_count * EVENT.size]))
+
+    def frames(self):
+        """
+        Input di ogni tick, in ordine.
+
+        Yields:
+            (tasti dei KEYDOWN da applicare prima del tick, KeyState del tick)
+        """
+        states = {}
+        events = self.events
+        next_event = 0
+        tick = 0
+        for mask, length in self.runs:
+            state = states.get(mask)
+            if state is None:
+                state = states[mask] = KeyState(mask_keys(mask))
+            for _ in range(length):
+                keydowns = []
+                while next_event < len(events) and events[next_event][0] <= tick:
+                    keydowns.append(events[next_event][1])
+                    next_event += 1
+                yield keydowns, state
+                tick += 1
+
+
+def replay(log, simulation=None):
+    """
+    Rifà una partita registrata senza display, alla massima velocità.
+
+    Args:
+        log: InputLog (o percorso di un file .mlrec)
+        simulation: HeadlessSimulation da usare (default: nuova, con i parametri della registrazione)
+
+    Returns:
+        HeadlessSimulation alla fine della partita
+    """
+    if not isinstance(log, InputLog):
+        log = InputLog(log)
+    if simulation is None:
+        simulation = HeadlessSimulation(log.map_name, log.time_speed, log.start_time, log.end_time)
+
+    for keydowns, state in log.frames():
+        for key in keydowns:
+            simulation.press(key)
+        simulation.key_state = state
+        simulation.step()
+    return simulation
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    if len(sys.argv) < 2:
+        raise SystemExit("Uso: python replay.py <file .mlrec>")
+
+    input_log = InputLog(sys.argv[1])
+    start = time.perf_counter()
+    finished = replay(input_log)
+    elapsed = time.perf_counter() - start
+    player = finished.level.player
+    print(f"{input_log.ticks} tick ({input_log.ticks / TICK_RATE:.0f}s di gioco) in {elapsed:.3f}s: {input_log.ticks / elapsed:.0f} tick/s")
+    print(f"Mappa {finished.level.map_name}, loop #{finished.time_manager.loop_count} "
+          f"ore {finished.time_manager.format_time()}, player {player.rect.topleft}")
+    finished.close()
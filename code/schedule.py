@@ -0,0 +1,100 @@
+import heapq
+from conditions import parse_value
+
+
+def parse_schedule(value):
+    """
+    Legge la routine di un NPC dalla property 'schedule' di Tiled:
+    "HH:MM, luogo, attività, dialogue_id; HH:MM, ..." (campi finali opzionali,
+    un campo vuoto lascia invariato quel valore).
+
+    Es: "9:00, mercato, vende, merchant_morning; 13:00, chiesa, prega; 18:00, , , merchant_evening"
+
+    Il tempo di gioco avanza a ore intere, quindi un evento scatta al primo
+    tick d'ora successivo (un evento alle 9:30 scatta alle 10:00); quelli
+    fino a end_time compreso scattano prima del reset del loop.
+
+    Returns:
+        Lista di dict {'time', 'location', 'activity', 'dialogue_id'} ordinata per ora
+    """
+    entries = []
+    for item in str(value).split(';'):
+        if not item.strip():
+            continue
+        fields = [field.strip() or None for field in item.split(',')]
+        fields += [None] * (4 - len(fields))
+        time = parse_value(fields[0])
+        if not isinstance(time, (int, float)):
+            raise ValueError(f"Orario non valido nello schedule: '{fields[0]}'")
+        entries.append({
+            'time': float(time),
+            'location': fields[1],
+            'activity': fields[2],
+            'dialogue_id': fields[3]
+        })
+    entries.sort(key=lambda entry: entry['time'])
+    return entries
+
+
+class Schedule:
+    """
+    Coda globale degli eventi delle routine degli NPC, ordinata per ora di gioco.
+
+    Le routine di tutti gli NPC (di tutti i livelli) vengono compilate in
+    un unico heap: il TimeManager estrae solo gli eventi scaduti, invece di
+    far controllare l'orologio a ogni NPC a ogni frame. Il template resta
+    intatto, quindi rewind() a inizio loop è una semplice copia (una lista
+    copiata da un heap è ancora un heap).
+
+    Un evento è una tupla (ora, ordine, owner, npc, entry): owner è chi lo
+    applica (il Level dell'NPC, con apply_schedule(events)).
+    """
+
+    def __init__(self):
+        self.template = []  # Tutti gli eventi del loop
+        self.queue = []     # Eventi non ancora avvenuti nel loop corrente
+        self.order = 0      # A parità di ora vale l'ordine di inserimento
+
+    def __len__(self):
+        return len(self.queue)
+
+    def add_routine(self, owner, npc, entries):
+        """
+        Registra la routine di un NPC.
+
+        Gli eventi già passati nel loop corrente scattano al prossimo update,
+        in ordine: l'NPC si porta subito nello stato previsto per l'ora attuale.
+        """
+        for entry in entries:
+            event = (entry['time'], self.order, owner, npc, entry)
+            self.order += 1
+            heapq.heappush(self.template, event)
+            heapq.heappush(self.queue, event)
+
+    def remove_owner(self, owner):
+        """Toglie gli eventi di un livello (es. scaricato da MapManager)"""
+        self.template = [event for event in self.template if event[2] is not owner]
+        self.queue = [event for event in self.queue if event[2] is not owner]
+        heapq.heapify(self.template)
+        heapq.heapify(self.queue)
+
+    def next_time(self):
+        """Ora del prossimo evento, None se la coda è vuota"""
+        return self.queue[0][0] if self.queue else None
+
+    def pop_due(self, now):
+        """
+        Estrae gli eventi con ora <= now.
+
+        Returns:
+            Lista di eventi in ordine di ora
+        """
+        due = []
+        queue = self.queue
+        while queue and queue[0][0] <= now:
+            due.append(heapq.heappop(queue))
+        return due
+
+    def rewind(self):
+        """Riporta la coda all'inizio del loop"""
+        self.queue = self.template.copy()
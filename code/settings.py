@@ -3,6 +3,13 @@ WIDTH = 1280
 HEIGTH = 720
 FPS = 60
 TILESIZE = 16
+MAP_DIR = '../map'  # Cartella con CSV, JSON di Tiled e floor_map.png (altre mappe in MAP_DIR/<nome>/)
+PLAYER_SPAWN = (685, 210)
+
+# Simulazione a passo fisso (indipendente dagli FPS)
+TICK_RATE = 60                # Tick di simulazione al secondo
+TICK_TIME = 1.0 / TICK_RATE   # Durata di un tick in secondi
+MAX_FRAME_TIME = 0.25         # Frame più lunghi vengono tagliati (evita la spirale di lag)
 
 # Time system
 TIME_SPEED = 5.0  # Secondi reali per ogni ora di gioco
@@ -14,4 +21,61 @@ TIMER_FONT_SIZE = 28
 TIMER_POSITION = (WIDTH - 140, 20)  # Alto a destra
 TIMER_BG_COLOR = (20, 20, 40, 200)  # Blu scuro semi-trasparente
 TIMER_TEXT_COLOR = (255, 255, 255)  # Bianco
-TIMER_BORDER_COLOR = (200, 200, 220)  # Grigio chiaro
\ No newline at end of file
+TIMER_BORDER_COLOR = (200, 200, 220)  # Grigio chiaro
+
+# Collisioni
+GRID_CELL_SIZE = TILESIZE * 4  # Lato di una cella della griglia spaziale (allineata ai tiles)
+
+# Rendering
+ANIMATED_WALKABLE_IDS = {3, 4}  # 03_erbaMove, 04_girasoleMove: restano sprite separati
+
+# Mondo a chunk (pavimento, tiles e collisioni caricati solo attorno al player)
+CHUNK_TILES = 32  # Tiles per lato di un chunk
+CHUNK_SIZE = TILESIZE * CHUNK_TILES  # Lato di un chunk in pixel
+CHUNK_LOAD_RADIUS = 2  # Chunk tenuti caricati attorno al player (per lato)
+CHUNK_UNLOAD_RADIUS = 3  # Oltre questa distanza i chunk vengono scaricati (isteresi)
+CHUNK_BUILDS_PER_TICK = 2  # Chunk costruiti al massimo per tick (evita scatti)
+CHUNK_LOAD_WORKERS = 2  # Thread che decodificano il pavimento dei chunk
+
+# Assets
+ASSET_CACHE_MAX_IMAGES = None  # Numero massimo di immagini in cache (None = nessun limite)
+TEXT_CACHE_MAX_ENTRIES = 512  # Testi renderizzati tenuti in cache (LRU)
+ASSET_LOAD_WORKERS = 4  # Thread che decodificano le immagini all'avvio
+ASSET_PRELOAD_FOLDERS = [  # Cartelle dell'atlante delle texture (decodificate in parallelo quando va rifatto)
+    '../graphics/obstacle_objects',
+    '../graphics/walkable_objects',
+    '../graphics/player/up',
+    '../graphics/player/down',
+    '../graphics/player/left',
+    '../graphics/player/right',
+    '../graphics/npc',
+]
+ATLAS_DIR = '../graphics/.cache'  # Fogli e indice dell'atlante delle texture (rigenerati se le immagini cambiano)
+ATLAS_SHEET_SIZE = 1024  # Lato massimo di un foglio dell'atlante
+
+# Profiler (F3 overlay, F4 traccia su file)
+PROFILER_ENABLED = True
+PROFILER_WINDOW = 120  # Frame nella finestra mobile (media e p99)
+PROFILER_TRACE_PATH = '../profiler_trace.csv'  # .csv o .json
+
+# Dialoghi
+DIALOGUE_PATH = '../data/dialogues.json'
+DIALOGUE_SHARD_DIR = '../data/dialogues'  # index.json + uno shard per NPC/capitolo (opzionale)
+DIALOGUE_MAX_SHARDS = 8  # Shard tenuti in memoria (LRU)
+
+# NPC
+NPC_WANDER_RADIUS = TILESIZE * 4  # Distanza massima dalla posizione iniziale per il wander
+NPC_WANDER_PAUSE = (30, 120)  # Tick di pausa (min, max) tra due spostamenti del wander
+NPC_RANDOM_SEED = 0  # Seme del wander (stesso movimento a ogni partita)
+
+# Navigazione (A* e flow field)
+NAV_PATH_CACHE_SIZE = 256  # Percorsi tenuti in cache (LRU)
+NAV_MAX_SEARCH_NODES = 20000  # Celle espanse al massimo da una ricerca A*
+
+# Mappe
+MAP_PRELOAD_WORKERS = 2  # Thread che precaricano le mappe collegate
+MAP_CACHE_SIZE = 3  # Livelli già costruiti tenuti in memoria
+
+# Registrazione input (replay.py)
+RECORD_INPUT = False  # Se True ogni partita salva i tasti in REPLAY_DIR (per riprodurre i bug)
+REPLAY_DIR = '../replays'
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+class WorldSnapshot:
+    """
+    Stato del mondo di un livello a inizio loop.
+
+    Tiene solo ciò che cambia durante un loop: player, NPC (posizioni,
+    movimento, attività e dialogo assegnato), stato del dialogo, porte e
+    celle bloccate della navigazione. Mappa, sprite dei chunk e asset non
+    vengono toccati, quindi il ripristino non ricarica nulla e costa pochi
+    millisecondi. Lo schedule si riavvolge da solo nel TimeManager.
+    """
+
+    def __init__(self, level):
+        """
+        Args:
+            level: Level da fotografare (subito dopo la creazione = inizio loop)
+        """
+        player = level.player
+        self.player = {
+            'topleft': player.rect.topleft,
+            'status': player.status,
+            'frame_index': player.frame_index,
+            'can_move': player.can_move,
+            'nearby_npc': player.nearby_npc  # Va insieme al can_interact degli NPC
+        }
+
+        self.npcs = [
+            (npc, {'dialogue_id': npc.dialogue_id, 'activity': npc.activity, 'can_interact': npc.can_interact})
+            for npc in level.npc_movement.npcs
+        ]
+        self.movement = level.npc_movement.get_state()
+
+        manager = level.dialogue_manager
+        self.dialogue = {
+            'active': manager.active,
+            'current_dialogue': manager.current_dialogue,
+            'current_npc': manager.current_npc,
+            'initiated_by': manager.initiated_by,
+            'dialogue_box': manager.dialogue_box
+        }
+
+        self.doors = [dict(door, rect=door['rect'].copy()) for door in level.doors]
+        self.walkable = level.navigation.walkable.copy()
+
+    def restore(self, level):
+        """
+        Riporta il livello allo stato della snapshot, riscrivendo solo ciò
+        che è diverso.
+
+        Returns:
+            Numero di oggetti (player, NPC, porte...) ripristinati
+        """
+        restored = 0
+
+        player = level.player
+        if player.rect.topleft != self.player['topleft']:
+            player.rect.topleft = self.player['topleft']
+            player.hitbox.center = player.rect.center
+            player.previous_topleft = player.rect.topleft  # Niente interpolazione sul teletrasporto
+            restored += 1
+        for name, value in self.player.items():
+            if name != 'topleft' and getattr(player, name) != value:
+                setattr(player, name, value)
+        player.direction.update(0, 0)
+
+        for npc, attributes in self.npcs:
+            changed = False
+            for name, value in attributes.items():
+                if getattr(npc, name) != value:
+                    setattr(npc, name, value)
+                    changed = True
+            restored += changed
+        restored += level.npc_movement.set_state(self.movement)
+
+        manager = level.dialogue_manager
+        for name, value in self.dialogue.items():
+            if getattr(manager, name) is not value:
+                setattr(manager, name, value)
+
+        if level.doors != self.doors:
+            level.doors = [dict(door, rect=door['rect'].copy()) for door in self.doors]
+            restored += 1
+
+        # Celle bloccate o liberate durante il loop (porte, oggetti): percorsi e flow field da rifare
+        navigation = level.navigation
+        if not np.array_equal(navigation.walkable, self.walkable):
+            np.copyto(navigation.walkable, self.walkable)
+            navigation.paths.clear()
+            navigation.flow_fields.clear()
+            navigation.precompute_destinations()
+            restored += 1
+
+        return restored
@@ -0,0 +1,84 @@
+import pygame
+from settings import *
+
+class SpatialGrid:
+    """
+    Griglia uniforme per interrogare velocemente le hitbox vicine.
+
+    Ogni rect viene registrato in tutte le celle che tocca; una query
+    controlla solo le celle coperte dal rect richiesto, quindi il costo
+    non dipende dalla dimensione della mappa.
+    """
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        """
+        Args:
+            cell_size: Lato di una cella in pixel (multiplo di TILESIZE)
+        """
+        self.cell_size = cell_size
+        self.cells = {}    # (col, row) -> lista di rect
+        self.entries = {}  # id(rect) -> (rect, celle occupate)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _cells_for(self, rect):
+        """Restituisce le celle coperte da un rect"""
+        size = self.cell_size
+        return [
+            (col, row)
+            for col in range(rect.left // size, (rect.right - 1) // size + 1)
+            for row in range(rect.top // size, (rect.bottom - 1) // size + 1)
+        ]
+
+    def insert(self, rect):
+        """
+        Registra un rect nella griglia.
+
+        Il rect viene tenuto per riferimento: se si sposta va chiamato move().
+        """
+        cells = self._cells_for(rect)
+        self.entries[id(rect)] = (rect, cells)
+        for cell in cells:
+            self.cells.setdefault(cell, []).append(rect)
+
+    def remove(self, rect):
+        """Rimuove un rect dalla griglia"""
+        entry = self.entries.pop(id(rect), None)
+        if entry is None:
+            return
+        for cell in entry[1]:
+            bucket = self.cells[cell]
+            # Per identità: list.remove() confronta i valori e toglierebbe un altro rect uguale
+            for index, candidate in enumerate(bucket):
+                if candidate is rect:
+                    del bucket[index]
+                    break
+            if not bucket:
+                del self.cells[cell]
+
+    def move(self, rect):
+        """Aggiorna le celle di un rect che si e' spostato"""
+        entry = self.entries.get(id(rect))
+        if entry is None:
+            self.insert(rect)
+            return
+        if self._cells_for(rect) != entry[1]:
+            self.remove(rect)
+            self.insert(rect)
+
+    def query(self, rect):
+        """
+        Restituisce i rect registrati nelle celle coperte da rect.
+
+        Returns:
+            Lista di rect candidati (senza duplicati), da verificare con colliderect
+        """
+        found = []
+        seen = set()
+        for cell in self._cells_for(rect):
+            for candidate in self.cells.get(cell, ()):
+                if id(candidate) not in seen:
+                    seen.add(id(candidate))
+                    found.append(candidate)
+        return found
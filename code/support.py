@@ -1,24 +1,55 @@
-from csv import reader
-from os import walk
+import numpy as np
 import pygame
+from assets import asset_manager
 
 def import_csv_layout(path):
-    terrain_map = []
-    with open(path) as level_map:
-        layout = reader(level_map, delimiter=',')
-        for row in layout:
-            terrain_map.append(list(row))
-        return terrain_map
+    """Legge un layer CSV di Tiled come array NumPy int16 (righe x colonne), -1 = vuoto"""
+    return np.loadtxt(path, delimiter=',', dtype=np.int16, ndmin=2)
     
 
 def import_folder(path):
+    """Immagini di una cartella ordinate per nome (memorizzate nell'asset manager)"""
+    return asset_manager.folder(path)
 
-    surface_list = []
+def merge_collision_cells(layout, tile_size):
+    """
+    Unisce le celle di collisione adiacenti in pochi rect allineati agli assi.
 
-    for _,__,img_files in walk(path):
-        for image in img_files:
-            full_path = path + '/' + image
-            img_surface = pygame.image.load(full_path).convert_alpha()
-            surface_list.append(img_surface)
-    
-    return surface_list
+    Algoritmo greedy: per ogni cella libera allarga il rect a destra finché
+    trova celle piene, poi verso il basso finché l'intera riga è piena.
+    Ogni rect ha la stessa hitbox dei vecchi Tile invisibili (2px in meno
+    sopra e sotto).
+
+    Args:
+        layout: Array int16 del layer di collisione (-1 = vuoto)
+
+    Returns:
+        Lista di pygame.Rect
+    """
+    filled = np.asarray(layout) != -1
+    rows, cols = filled.shape
+    rects = []
+
+    for row_index, col_index in zip(*np.nonzero(filled)):
+        # La cella può essere già stata assorbita da un rect precedente
+        if not filled[row_index, col_index]:
+            continue
+
+        # Allarga a destra
+        row = filled[row_index, col_index:]
+        end_col = col_index + (int(np.argmin(row)) if not row.all() else len(row)) - 1
+
+        # Allarga verso il basso finché la riga sotto è piena
+        end_row = row_index
+        while end_row + 1 < rows and filled[end_row + 1, col_index:end_col + 1].all():
+            end_row += 1
+
+        # Segno le celle come usate
+        filled[row_index:end_row + 1, col_index:end_col + 1] = False
+
+        width = (end_col - col_index + 1) * tile_size
+        height = (end_row - row_index + 1) * tile_size
+        rect = pygame.Rect(int(col_index) * tile_size, int(row_index) * tile_size, int(width), int(height))
+        rects.append(rect.inflate(0, -4))
+
+    return rects
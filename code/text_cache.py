@@ -0,0 +1,77 @@
+import pygame
+from collections import OrderedDict
+from settings import *
+
+class TextCache:
+    """
+    Cache dei testi renderizzati e del word wrap.
+
+    Le chiavi sono (font, testo, colore) per le singole righe e
+    (font, testo, colore, larghezza) per i testi a capo: ogni stringa
+    viene misurata e renderizzata una volta sola finché resta in cache.
+    """
+
+    def __init__(self, max_entries=TEXT_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            max_entries: Numero massimo di voci per cache (LRU)
+        """
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()  # (font, text, color) -> Surface
+        self.layouts = OrderedDict()   # (font, text, color, max_width) -> lista di (riga, Surface)
+
+    def _store(self, cache, key, value):
+        cache[key] = value
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+        return value
+
+    def render(self, font, text, color):
+        """Restituisce la Surface di una riga di testo (antialias)"""
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        return self._store(self.surfaces, key, font.render(text, True, color))
+
+    def wrap(self, font, text, color, max_width):
+        """
+        Divide il testo in righe larghe al massimo max_width e le renderizza.
+
+        Returns:
+            Lista di tuple (riga, Surface)
+        """
+        key = (font, text, color, max_width)
+        layout = self.layouts.get(key)
+        if layout is not None:
+            self.layouts.move_to_end(key)
+            return layout
+
+        words = text.split(' ')
+        lines = []
+        current_line = []
+
+        for word in words:
+            # font.size misura senza renderizzare
+            test_line = ' '.join(current_line + [word])
+            if font.size(test_line)[0] <= max_width:
+                current_line.append(word)
+            else:
+                if current_line:
+                    lines.append(' '.join(current_line))
+                current_line = [word]
+
+        if current_line:
+            lines.append(' '.join(current_line))
+
+        layout = [(line, font.render(line, True, color)) for line in lines]
+        return self._store(self.layouts, key, layout)
+
+    def clear(self):
+        """Svuota la cache"""
+        self.surfaces.clear()
+        self.layouts.clear()
+
+
+text_cache = TextCache()
@@ -0,0 +1,66 @@
+import numpy as np
+import pygame
+from settings import *
+
+class TileLayer:
+    """
+    Layer di tiles come array NumPy int16 (righe x colonne, -1 = vuoto).
+
+    È la fonte unica per le ricerche sulla mappa (costruzione dei chunk,
+    griglia di navigazione): le query sono vettorizzate invece di scorrere
+    liste di stringhe.
+    """
+
+    def __init__(self, name, cells, tile_size=TILESIZE):
+        """
+        Args:
+            name: Nome del layer (es: 'collision')
+            cells: Array 2D di id dei tiles
+            tile_size: Lato di un tile in pixel
+        """
+        self.name = name
+        self.cells = cells
+        self.tile_size = tile_size
+        self.height, self.width = cells.shape
+
+    def __len__(self):
+        return self.cells.size
+
+    def mask(self):
+        """Array booleano delle celle non vuote"""
+        return self.cells != -1
+
+    def nonempty(self):
+        """
+        Tutte le celle non vuote.
+
+        Returns:
+            Tupla di liste (righe, colonne, id) in ordine di riga
+        """
+        rows, cols = np.nonzero(self.cells != -1)
+        return rows.tolist(), cols.tolist(), self.cells[rows, cols].tolist()
+
+    def cell_bounds(self, rect):
+        """Intervallo di celle (col_start, row_start, col_end, row_end) coperto da rect, tagliato alla mappa"""
+        rect = pygame.Rect(rect)
+        col_start = max(0, rect.left // self.tile_size)
+        row_start = max(0, rect.top // self.tile_size)
+        col_end = min(self.width, (rect.right - 1) // self.tile_size + 1)
+        row_end = min(self.height, (rect.bottom - 1) // self.tile_size + 1)
+        return col_start, row_start, col_end, row_end
+
+    def cells_in_rect(self, rect):
+        """
+        Celle non vuote che cadono dentro un rect in pixel.
+
+        Returns:
+            Tupla di array (righe, colonne, id) in coordinate della mappa
+        """
+        col_start, row_start, col_end, row_end = self.cell_bounds(rect)
+        if col_start >= col_end or row_start >= row_end:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty, np.empty(0, dtype=self.cells.dtype)
+
+        window = self.cells[row_start:row_end, col_start:col_end]
+        rows, cols = np.nonzero(window != -1)
+        return rows + row_start, cols + col_start, window[rows, cols]
@@ -1,14 +1,19 @@
 import pygame
 from settings import *
+from hud import ClockWidget
+from schedule import Schedule
 
 class TimeManager:
     """
     Gestisce il sistema temporale del gioco e il loop temporale.
     
     Il tempo avanza da 9:00 a 21:00, poi resetta.
+
+    Tiene anche la coda degli eventi delle routine degli NPC (schedule):
+    a ogni update vengono estratti solo gli eventi scaduti.
     """
     
-    def __init__(self, time_speed=5.0, start_time=9.0, end_time=21.0):
+    def __init__(self, time_speed=5.0, start_time=9.0, end_time=21.0, verbose=True):
         """
         Inizializza il time manager.
         
@@ -16,10 +21,12 @@ class TimeManager:
             time_speed: Secondi reali per ogni ora di gioco (default: 5)
             start_time: Ora di inizio del loop (default: 9.0 = 09:00)
             end_time: Ora di fine del loop (default: 21.0 = 21:00)
+            verbose: Se False non stampa l'inizio di ogni loop (simulazione headless)
         """
         self.time_speed = time_speed  # Secondi reali per ora di gioco
         self.start_time = start_time
         self.end_time = end_time
+        self.verbose = verbose
         
         # Stato attuale
         self.current_time = start_time
@@ -29,6 +36,12 @@ class TimeManager:
         # Variabili per timer
         self.accumulated_time = 0.0
         self.just_reset = False
+
+        # Routine degli NPC, in un'unica coda ordinata per ora
+        self.schedule = Schedule()
+
+        # Widget dell'orologio (creato al primo draw, quando si conosce il font)
+        self.clock_widget = None
     
     def update(self, delta_time):
         """
@@ -51,20 +64,63 @@ class TimeManager:
             
             # Check se abbiamo raggiunto la fine del loop
             if self.current_time >= self.end_time:
+                # Gli eventi fino alla fine del loop (es. 20:30, 21:00) scattano prima del reset
+                self.dispatch_schedule(self.end_time)
                 self.reset_loop()
                 break  # Esci dopo il reset
 
+        self.dispatch_schedule()
+
+    def next_event_time(self):
+        """Ora del prossimo evento dello schedule, o della fine del loop se viene prima"""
+        next_time = self.schedule.next_time()
+        return self.end_time if next_time is None else min(next_time, self.end_time)
+
+    def skip(self, seconds):
+        """
+        Avanza il clock senza applicare lo schedule né resettare il loop.
+
+        Solo per salti che si fermano prima di next_event_time()
+        (HeadlessSimulation.fast_forward).
+        """
+        self.accumulated_time += seconds
+        hours = int(self.accumulated_time // self.time_speed)
+        self.current_time += hours
+        self.accumulated_time -= hours * self.time_speed
+
+    def dispatch_schedule(self, now=None):
+        """
+        Applica gli eventi dello schedule arrivati all'ora indicata.
+
+        Args:
+            now: Ora di gioco (default: current_time)
+        """
+        if now is None:
+            now = self.current_time
+        next_time = self.schedule.next_time()
+        if next_time is None or next_time > now:
+            return
+
+        # Raggruppati per livello, nell'ordine in cui sono scaduti
+        by_owner = {}
+        for event in self.schedule.pop_due(now):
+            by_owner.setdefault(id(event[2]), []).append(event)
+        for events in by_owner.values():
+            events[0][2].apply_schedule(events)
+
     def reset_loop(self):
         """
         Resetta il loop temporale.
         Riporta il tempo all'inizio e incrementa il contatore loop.
         """
         self.current_time = self.start_time
+        self.schedule.rewind()
         self.loop_count += 1
         self.accumulated_time = 0.0
         self.just_reset = True
         
-        print(f"🔄 Loop #{self.loop_count} iniziato!")  # Debug info
+        if self.verbose:
+            print(f"🔄 Loop #{self.loop_count} iniziato!")  # Debug info
     
     def pause(self):
         """Mette in pausa il tempo."""
@@ -106,36 +162,29 @@ class TimeManager:
         """
         return self.get_time_remaining() <= threshold
     
+    @property
+    def dirty_rect(self):
+        """
+        Area dello schermo cambiata dall'ultimo draw del timer.
+
+        Returns:
+            pygame.Rect, oppure None se il timer non è cambiato
+        """
+        if self.clock_widget is None:
+            return None
+        return self.clock_widget.dirty_rect
+
     def draw(self, screen, font):
         """
         Disegna il timer sullo schermo.
         
+        La Surface del timer viene ricostruita solo quando cambia format_time().
+        
         Args:
             screen: pygame.Surface dove disegnare
             font: pygame.Font da usare per il testo
         """
-        # Formatta il tempo
-        time_text = self.format_time()
-        
-        # Crea superficie di testo
-        text_surface = font.render(time_text, True, TIMER_TEXT_COLOR)
-        text_rect = text_surface.get_rect()
-        
-        # Box per il timer
-        padding = 10
-        box_width = text_rect.width + padding * 2
-        box_height = text_rect.height + padding * 2
-        box_x, box_y = TIMER_POSITION
-        
-        # Disegna background semi-trasparente
-        timer_surface = pygame.Surface((box_width, box_height), pygame.SRCALPHA)
-        pygame.draw.rect(timer_surface, TIMER_BG_COLOR, timer_surface.get_rect(), border_radius=5)
-        pygame.draw.rect(timer_surface, TIMER_BORDER_COLOR, timer_surface.get_rect(), width=2, border_radius=5)
-        
-        # Disegna il box sullo schermo
-        screen.blit(timer_surface, (box_x, box_y))
+        if self.clock_widget is None or self.clock_widget.font is not font:
+            self.clock_widget = ClockWidget(self, font)
         
-        # Disegna il testo centrato nel box
-        text_x = box_x + padding
-        text_y = box_y + padding
-        screen.blit(text_surface, (text_x, text_y))
\ No newline at end of file
+        self.clock_widget.draw(screen)
@@ -0,0 +1,250 @@
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+from settings import *
+from tile import Tile
+from support import import_folder
+from spatial_grid import SpatialGrid
+from map_compiler import read_floor_chunk, chunk_keys_around
+
+# Thread condivisi da tutti i livelli per decodificare i PNG dei chunk
+chunk_loader = ThreadPoolExecutor(max_workers=CHUNK_LOAD_WORKERS, thread_name_prefix='chunk_load')
+
+
+class Chunk:
+    """Un pezzo di mondo di CHUNK_TILES x CHUNK_TILES tiles con i suoi sprite e collisioni"""
+
+    def __init__(self, key):
+        self.key = key
+        self.rect = pygame.Rect(key[0] * CHUNK_SIZE, key[1] * CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE)
+        self.obstacle_tiles = []   # Tiles ostacolo con la cella di origine nel chunk
+        self.animated_tiles = []   # Tiles calpestabili animati
+        self.grid = SpatialGrid()  # Rect di collisione che toccano il chunk + hitbox dei suoi tiles
+
+
+class ChunkManager:
+    """
+    Tiene in memoria solo i chunk attorno al player.
+
+    Il pavimento di ogni chunk (con i tiles calpestabili già disegnati) viene
+    preparato da map_compiler e decodificato su chunk_loader; sul thread
+    principale restano convert() e la creazione degli sprite, al massimo
+    CHUNK_BUILDS_PER_TICK chunk per tick. I chunk oltre CHUNK_UNLOAD_RADIUS
+    vengono scaricati, quindi la memoria dipende dalla distanza di vista e
+    non dalla dimensione della mappa.
+
+    Espone la stessa interfaccia di SpatialGrid (insert, remove, move,
+    query): le collisioni statiche stanno nelle griglie dei chunk, quelle
+    che si muovono (NPC) in una griglia condivisa.
+    """
+
+    def __init__(self, level_data, visible_sprites, headless=False,
+                 load_radius=CHUNK_LOAD_RADIUS, unload_radius=CHUNK_UNLOAD_RADIUS):
+        """
+        Args:
+            level_data: LevelData della mappa
+            visible_sprites: YSortCameraGroup del livello
+            headless: Se True non carica il pavimento e costruisce i chunk subito
+            load_radius: Chunk caricati attorno al player (per lato)
+            unload_radius: Oltre questa distanza (in chunk) i chunk vengono scaricati
+        """
+        self.map_name = level_data.map_name
+        self.map_dir = level_data.map_dir
+        self.layers = level_data.map.layers
+        self.floors = level_data.floors  # Pavimenti già decodificati dal precaricamento
+        self.visible_sprites = visible_sprites
+        self.headless = headless
+        self.load_radius = load_radius
+        self.unload_radius = max(load_radius, unload_radius)
+
+        self.bounds = pygame.Rect(0, 0, level_data.map.width * TILESIZE, level_data.map.height * TILESIZE)
+        self.cols = -(-self.bounds.width // CHUNK_SIZE)
+        self.rows = -(-self.bounds.height // CHUNK_SIZE)
+        visible_sprites.floor_rect = self.bounds.copy()
+
+        self.graphics = {
+            'walkable_objects' : import_folder('../graphics/walkable_objects'),
+            'obstacle_objects' : import_folder('../graphics/obstacle_objects')
+        }
+        # Un tile può sporgere nei chunk vicini: le query guardano anche lì
+        self.margin = max((max(surf.get_size()) for surf in self.graphics['obstacle_objects']), default=TILESIZE)
+
+        # I rect uniti sono pochi: li divido per chunk una volta sola
+        self.chunk_rects = {}
+        for rect in level_data.map.collision_rects:
+            rect = pygame.Rect(rect)
+            for key in self.keys_in_rect(rect):
+                self.chunk_rects.setdefault(key, []).append(rect)
+
+        self.chunks = {}    # (col, row) -> Chunk caricato
+        self.pending = {}   # (col, row) -> Future del pavimento
+        self.center_key = None  # Chunk del player all'ultimo update
+        self.dynamic = SpatialGrid()
+
+    def __len__(self):
+        return len(self.dynamic) + sum(len(chunk.grid) for chunk in self.chunks.values())
+
+    def keys_in_rect(self, rect):
+        """Chiavi dei chunk (dentro la mappa) che toccano rect"""
+        rect = rect.clip(self.bounds)
+        if not rect.width or not rect.height:
+            return []
+        return [
+            (col, row)
+            for row in range(rect.top // CHUNK_SIZE, (rect.bottom - 1) // CHUNK_SIZE + 1)
+            for col in range(rect.left // CHUNK_SIZE, (rect.right - 1) // CHUNK_SIZE + 1)
+        ]
+
+    def keys_around(self, center, radius):
+        """Chiavi dei chunk entro radius chunk da center, dal più vicino"""
+        return chunk_keys_around(center, radius, self.cols, self.rows)
+
+    # --- Streaming ---------------------------------------------------------
+
+    def update(self, center, block=False):
+        """
+        Carica e scarica i chunk attorno a center (es. player.hitbox.center).
+
+        Args:
+            center: Posizione in pixel attorno a cui tenere il mondo
+            block: Se True costruisce subito tutti i chunk del raggio (caricamento iniziale)
+        """
+        # Stesso chunk e niente in arrivo: il raggio è già tutto caricato
+        center_key = (int(center[0]) // CHUNK_SIZE, int(center[1]) // CHUNK_SIZE)
+        if center_key == self.center_key and not self.pending and not block:
+            return
+        self.center_key = center_key
+
+        block = block or self.headless
+        wanted = self.keys_around(center, self.load_radius)
+
+        # Le collisioni attorno al player non possono aspettare il thread
+        needed = set(self.keys_in_rect(pygame.Rect(center, (0, 0)).inflate(self.margin * 2, self.margin * 2)))
+        if block:
+            needed.update(wanted)
+        # Pavimento già decodificato dal precaricamento: resta solo convert()
+        needed.update(key for key in wanted if key in self.floors)
+        for key in wanted:
+            if key in needed and key not in self.chunks:
+                self.load_now(key)
+
+        for key in wanted:
+            if key not in self.chunks and key not in self.pending:
+                self.pending[key] = chunk_loader.submit(self.read_floor, key)
+
+        built = 0
+        for key, future in list(self.pending.items()):
+            if built >= CHUNK_BUILDS_PER_TICK:
+                break
+            if future.done():
+                del self.pending[key]
+                self.build(key, future.result())
+                built += 1
+
+        self.unload_far(center)
+
+    def load_now(self, key):
+        """Costruisce un chunk sul thread principale (aspettando il pavimento se in corso)"""
+        future = self.pending.pop(key, None)
+        if key in self.floors:
+            floor = self.floors.pop(key)
+        else:
+            floor = future.result() if future is not None else self.read_floor(key)
+        self.build(key, floor)
+
+    def unload_far(self, center):
+        """Scarica i chunk (e annulla i caricamenti) oltre unload_radius"""
+        col = int(center[0]) // CHUNK_SIZE
+        row = int(center[1]) // CHUNK_SIZE
+
+        def far(key):
+            return max(abs(key[0] - col), abs(key[1] - row)) > self.unload_radius
+
+        for key in [key for key in self.pending if far(key)]:
+            self.pending.pop(key).cancel()
+        for key in [key for key in self.chunks if far(key)]:
+            self.unload(key)
+
+    def read_floor(self, key):
+        """Decodifica il PNG del pavimento di un chunk (eseguito su chunk_loader)"""
+        if self.headless:
+            return None
+        return read_floor_chunk(self.map_dir, self.map_name, key)
+
+    def build(self, key, floor):
+        """Crea sprite e collisioni di un chunk (thread principale)"""
+        if key in self.chunks:
+            return
+        chunk = Chunk(key)
+
+        for row, col, tile_id in zip(*(values.tolist() for values in self.layers['obstacle_objects'].cells_in_rect(chunk.rect))):
+            surf = self.graphics['obstacle_objects'][tile_id]
+            tile = Tile((col * TILESIZE, row * TILESIZE), [], 'obstacle_objects', surf)
+            chunk.obstacle_tiles.append(tile)
+
+        # Quelli fermi sono già disegnati nel pavimento del chunk
+        for row, col, tile_id in zip(*(values.tolist() for values in self.layers['walkable_objects'].cells_in_rect(chunk.rect))):
+            if tile_id in ANIMATED_WALKABLE_IDS:
+                surf = self.graphics['walkable_objects'][tile_id]
+                chunk.animated_tiles.append(Tile((col * TILESIZE, row * TILESIZE), [], 'walkable_objects', surf))
+
+        for rect in self.chunk_rects.get(key, ()):
+            chunk.grid.insert(rect)
+        for tile in chunk.obstacle_tiles:
+            chunk.grid.insert(tile.hitbox)
+
+        self.visible_sprites.add_static(chunk.obstacle_tiles)
+        self.visible_sprites.animated_sprites.extend(chunk.animated_tiles)
+        if floor is not None:
+            self.visible_sprites.floor_chunks[key] = floor.convert()
+
+        self.chunks[key] = chunk
+
+    def unload(self, key):
+        """Toglie un chunk dai gruppi e dalla memoria"""
+        chunk = self.chunks.pop(key)
+        self.visible_sprites.remove_static(chunk.obstacle_tiles)
+        if chunk.animated_tiles:
+            animated = set(chunk.animated_tiles)
+            self.visible_sprites.animated_sprites = [sprite for sprite in self.visible_sprites.animated_sprites if sprite not in animated]
+        self.visible_sprites.floor_chunks.pop(key, None)
+
+    def close(self):
+        """Annulla i caricamenti in corso e lascia i layer della mappa (per chiuderla)"""
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.floors.clear()
+        self.layers = {}
+
+    # --- Interfaccia SpatialGrid -------------------------------------------
+
+    def insert(self, rect):
+        """Registra un rect che si muove (es. hitbox di un NPC)"""
+        self.dynamic.insert(rect)
+
+    def remove(self, rect):
+        self.dynamic.remove(rect)
+
+    def move(self, rect):
+        self.dynamic.move(rect)
+
+    def query(self, rect):
+        """
+        Restituisce i rect di collisione vicini a rect: statici dai chunk
+        caricati e dinamici dalla griglia condivisa.
+
+        Returns:
+            Lista di rect candidati (senza duplicati), da verificare con colliderect
+        """
+        found = []
+        seen = set()
+        for key in self.keys_in_rect(rect.inflate(self.margin * 2, self.margin * 2)):
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                continue
+            for candidate in chunk.grid.query(rect):
+                if id(candidate) not in seen:
+                    seen.add(id(candidate))
+                    found.append(candidate)
+        found.extend(self.dynamic.query(rect))
+        return found